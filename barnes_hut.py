@@ -0,0 +1,184 @@
+"""
+Barnes-Hut tree solver for the many body simulations. The bodies are sorted into a quadtree (2D) or an octree (3D) and
+each body only interacts directly with the nearby ones: a group of far away bodies is replaced by its total mass placed
+at its center of mass. A node of size s at a distance d is treated as a single body when s/d < theta, the opening angle.
+theta = 0 is equivalent to the direct sum, bigger values are faster and less precise.
+The tree is built and walked level by level with arrays, all the bodies walk the tree at the same time.
+Running this script prints the error against the direct sum for several opening angles, so theta can be chosen for a
+given error budget.
+"""
+import numpy as np
+
+from many_body_core import GRAVITATIONAL_CONSTANT, accumulate_rows, direct_accelerations
+
+# Opening angle used when none is given
+DEFAULT_THETA = 0.5
+# Bodies that are closer than this are left in the same leaf instead of dividing the space forever
+MAX_DEPTH = 32
+
+
+class Tree:
+    """
+    A quadtree or octree stored as arrays, one row per node. The nodes are created level by level, so the nodes of
+    each level are contiguous and the levels are stored in level_start.
+    Every leaf holds the bodies body_order[leaf_start[leaf]:leaf_start[leaf] + leaf_count[leaf]]
+    """
+    def __init__(self, positions, masses):
+        number_bodies, dimension = positions.shape
+        number_children = 2**dimension
+        # Bit of the child index that corresponds to each dimension, a body goes to the upper half if its bit is set
+        bits = 1 << np.arange(dimension)
+        signs = np.where((np.arange(number_children)[:, np.newaxis] & bits) > 0, 1.0, -1.0)
+
+        # Root node: a square (cube) that contains all the bodies
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        centers = [(low + high)[np.newaxis, :] / 2]
+        half_sizes = [np.array([max((high - low).max() / 2, 1e-9)])]
+        parents = [np.array([-1])]
+        level_start = [0]
+        number_nodes = 1
+
+        # Node each body is currently in, and bodies that still share their node with others
+        body_node = np.zeros(number_bodies, dtype=np.intp)
+        active = np.arange(number_bodies) if number_bodies > 1 else np.arange(0)
+        children_levels = list()
+        depth = 0
+        while active.size > 0 and depth < MAX_DEPTH:
+            depth += 1
+            current_centers = np.concatenate(centers)
+            # Child of its current node that each active body goes to
+            octant = ((positions[active] >= current_centers[body_node[active]]) * bits).sum(axis=1)
+            key = body_node[active] * number_children + octant
+            unique_keys, inverse = np.unique(key, return_inverse=True)
+            parent = unique_keys // number_children
+            child = unique_keys % number_children
+            new_nodes = number_nodes + np.arange(unique_keys.size)
+            children_levels.append((parent, child, new_nodes))
+
+            parent_half = np.concatenate(half_sizes)[parent]
+            centers.append(current_centers[parent] + signs[child] * parent_half[:, np.newaxis] / 2)
+            half_sizes.append(parent_half / 2)
+            parents.append(parent)
+            level_start.append(number_nodes)
+            number_nodes += unique_keys.size
+
+            body_node[active] = new_nodes[inverse]
+            # Only the nodes that still have more than one body are divided again
+            counts = np.bincount(inverse)
+            active = active[counts[inverse] > 1]
+        level_start.append(number_nodes)
+
+        self.dimension = dimension
+        self.centers = np.concatenate(centers)
+        self.half_sizes = np.concatenate(half_sizes)
+        self.parents = np.concatenate(parents)
+        self.level_start = level_start
+        self.children = np.full((number_nodes, number_children), -1, dtype=np.intp)
+        for parent, child, new_nodes in children_levels:
+            self.children[parent, child] = new_nodes
+        self.is_leaf = (self.children < 0).all(axis=1)
+
+        # Bodies of every leaf, contiguous once sorted by leaf
+        self.body_order = np.argsort(body_node, kind="stable")
+        self.leaf_count = np.bincount(body_node, minlength=number_nodes)
+        self.leaf_start = np.concatenate(([0], np.cumsum(self.leaf_count)[:-1]))
+
+        # Total mass and center of mass of every node, from the leaves up to the root
+        self.masses = np.bincount(body_node, weights=masses, minlength=number_nodes)
+        weighted = np.stack(
+            [np.bincount(body_node, weights=masses * positions[:, k], minlength=number_nodes) for k in range(dimension)],
+            axis=1
+        )
+        for level in range(len(level_start) - 2, 0, -1):
+            nodes = np.arange(level_start[level], level_start[level + 1])
+            np.add.at(self.masses, self.parents[nodes], self.masses[nodes])
+            np.add.at(weighted, self.parents[nodes], weighted[nodes])
+        self.centers_of_mass = np.zeros_like(weighted)
+        np.divide(weighted, self.masses[:, np.newaxis], out=self.centers_of_mass, where=self.masses[:, np.newaxis] > 0)
+
+
+def tree_accelerations(positions, masses, theta=DEFAULT_THETA, G=GRAVITATIONAL_CONSTANT):
+    """
+    Computes the gravitational acceleration every body suffers because of all the others walking a Barnes-Hut tree.
+    The interactions with the bodies of a leaf are computed exactly, the rest of the nodes are approximated by their
+    center of mass.
+    """
+    number_bodies = positions.shape[0]
+    accelerations = np.zeros_like(positions)
+    if number_bodies < 2:
+        return accelerations
+    tree = Tree(positions, masses)
+
+    # Every body starts the walk at the root
+    pair_body = np.arange(number_bodies)
+    pair_node = np.zeros(number_bodies, dtype=np.intp)
+    while pair_body.size > 0:
+        difference = tree.centers_of_mass[pair_node] - positions[pair_body]
+        distance = np.sqrt(np.einsum("ij,ij->i", difference, difference))
+        # A node can not be approximated if the body is inside it or if it is too big seen from the body
+        inside = (np.abs(positions[pair_body] - tree.centers[pair_node]) <= tree.half_sizes[pair_node, np.newaxis]).all(axis=1)
+        open_node = ~tree.is_leaf[pair_node] & (inside | (2 * tree.half_sizes[pair_node] >= theta * distance))
+
+        # Far away nodes, use the center of mass
+        far = ~open_node & ~tree.is_leaf[pair_node]
+        factor = G * tree.masses[pair_node[far]] / distance[far]**3
+        accumulate_rows(accelerations, pair_body[far], factor[:, np.newaxis] * difference[far])
+
+        # Leaves, exact interaction with each of their bodies
+        leaf = tree.is_leaf[pair_node]
+        leaf_body, leaf_node = pair_body[leaf], pair_node[leaf]
+        counts = tree.leaf_count[leaf_node]
+        body_i = np.repeat(leaf_body, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        body_j = tree.body_order[np.repeat(tree.leaf_start[leaf_node], counts) + offsets]
+        leaf_difference = positions[body_j] - positions[body_i]
+        leaf_distance = np.sqrt(np.einsum("ij,ij->i", leaf_difference, leaf_difference))
+        # The body with itself and coincident bodies do not interact
+        leaf_factor = np.zeros_like(leaf_distance)
+        np.divide(G * masses[body_j], leaf_distance**3, out=leaf_factor, where=leaf_distance > 0)
+        accumulate_rows(accelerations, body_i, leaf_factor[:, np.newaxis] * leaf_difference)
+
+        # Open nodes, continue the walk with their children
+        children = tree.children[pair_node[open_node]]
+        exists = children >= 0
+        pair_body = np.repeat(pair_body[open_node], exists.sum(axis=1))
+        pair_node = children[exists]
+    return accelerations
+
+
+def accuracy_check(number_bodies=2000, dimension=2, thetas=(0.1, 0.3, 0.5, 0.7, 1.0), box=700, seed=0):
+    """
+    Compares the tree accelerations with the direct sum for random bodies like the ones of the simulations.
+    Returns a list of (theta, median relative error, 99th percentile relative error, maximum relative error)
+    """
+    rng = np.random.default_rng(seed)
+    masses = rng.integers(10, 500, size=number_bodies).astype(float)
+    positions = rng.uniform(50, box, size=(number_bodies, dimension))
+    exact = direct_accelerations(positions, masses)
+    exact_norm = np.linalg.norm(exact, axis=1)
+
+    results = list()
+    for theta in thetas:
+        approximate = tree_accelerations(positions, masses, theta)
+        error = np.linalg.norm(approximate - exact, axis=1) / np.where(exact_norm > 0, exact_norm, 1)
+        results.append((theta, np.median(error), np.percentile(error, 99), error.max()))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Error of the Barnes-Hut solver against the direct sum")
+
+    # Add arguments to the parser
+    all_args.add_argument("-nb", "--number_bodies", type=int, default=2000, help="The number of bodies, integer")
+    all_args.add_argument("-d", "--dimension", type=int, default=2, choices=(2, 3), help="2 for the quadtree, 3 for the octree")
+    all_args.add_argument("-th", "--theta", type=float, nargs="+", default=[0.1, 0.3, 0.5, 0.7, 1.0], help="Opening angles to check")
+    all_args.add_argument("-s", "--seed", type=int, default=0, help="Seed of the random bodies")
+    args = vars(all_args.parse_args())
+
+    print(f"{args['number_bodies']} bodies in {args['dimension']}D, relative error of the acceleration")
+    print(f"{'theta':>6} {'median':>10} {'p99':>10} {'max':>10}")
+    for theta, median, p99, maximum in accuracy_check(args["number_bodies"], args["dimension"], args["theta"], seed=args["seed"]):
+        print(f"{theta:>6.2f} {median:>10.2e} {p99:>10.2e} {maximum:>10.2e}")
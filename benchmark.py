@@ -0,0 +1,130 @@
+"""
+Benchmark of the many body simulations. For every dimension, solver and number of bodies it measures the milliseconds
+per step of each stage (forces, collisions, integration, projection and, if there is a display, render) and the peak
+memory of a step. The results are written to a JSON file, and comparing them with an older file flags the stages that
+got slower.
+Example:
+    python benchmark.py -nb 25 100 1000 10000 -o benchmark.json --compare old_benchmark.json
+"""
+import json
+import platform
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from many_body_core import SOLVERS, BodySystem, StageTimer
+from many_body_render import PerspectiveProjection, TkRenderer, circle_boxes
+
+# A stage is flagged as a regression if it is this many times slower than in the compared file
+REGRESSION_FACTOR = 1.2
+
+
+def make_canvas(size):
+    """A Tkinter canvas to measure the render stage, None if there is no display"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return None
+    canvas = tk.Canvas(root, width=size, height=size, bg="black")
+    canvas.grid(row=0, column=0)
+    return canvas
+
+
+def benchmark_case(dimension, solver, number_bodies, steps, box=700, seed=0, canvas=None):
+    """Measures one case, returns its row of the results"""
+    rng = np.random.default_rng(seed)
+    # The box grows with the number of bodies so the density stays the same as with 25 bodies in 700
+    side = box * max(1, (number_bodies / 25)**(1 / dimension))
+    system = BodySystem.random(number_bodies, (side,) * dimension, rng, solver=solver)
+    if dimension == 3:
+        projection = PerspectiveProjection((side/2, side/2, side*1.25), side, (side/2,) * 3)
+    else:
+        projection = circle_boxes
+    renderer = TkRenderer(canvas, system, projection, overlay=False) if canvas is not None else None
+
+    # Peak memory of one step, measured apart because tracemalloc slows everything down
+    tracemalloc.start()
+    system.step()
+    projection(system)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    system.timer = StageTimer()
+    for _ in range(steps):
+        system.step()
+        if renderer is not None:
+            renderer(system)
+        else:
+            with system.timer("projection"):
+                projection(system)
+    return {
+        "dimension": dimension,
+        "solver": solver,
+        "number_bodies": number_bodies,
+        "steps": steps,
+        "milliseconds_per_step": system.timer.per_step(),
+        "peak_memory_bytes": peak,
+    }
+
+
+def compare(results, old_results):
+    """Prints the stages that are REGRESSION_FACTOR times slower than in the old results, returns how many there are"""
+    old = {(row["dimension"], row["solver"], row["number_bodies"]): row for row in old_results}
+    regressions = 0
+    for row in results:
+        old_row = old.get((row["dimension"], row["solver"], row["number_bodies"]))
+        if old_row is None:
+            continue
+        for stage, milliseconds in row["milliseconds_per_step"].items():
+            old_milliseconds = old_row["milliseconds_per_step"].get(stage)
+            if old_milliseconds and milliseconds > REGRESSION_FACTOR * old_milliseconds:
+                regressions += 1
+                print(
+                    f"Regression: {row['dimension']}D {row['solver']} {row['number_bodies']} bodies, {stage} "
+                    f"{old_milliseconds:.3f} ms -> {milliseconds:.3f} ms"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Time per step of every stage of the many body simulations")
+
+    # Add arguments to the parser
+    all_args.add_argument("-nb", "--number_bodies", type=int, nargs="+", default=[25, 100, 400, 1000, 3000, 10000], help="Numbers of bodies to sweep")
+    all_args.add_argument("-d", "--dimension", type=int, nargs="+", choices=(2, 3), default=[2, 3], help="Dimensions to sweep")
+    all_args.add_argument("-so", "--solver", nargs="+", choices=SOLVERS, default=list(SOLVERS), help="Force engines to sweep")
+    all_args.add_argument("-st", "--steps", type=int, default=5, help="Steps measured in every case")
+    all_args.add_argument("-o", "--output", default="benchmark.json", help="JSON file with the results")
+    all_args.add_argument("-c", "--compare", default=None, help="JSON file of an older benchmark to look for regressions")
+    args = vars(all_args.parse_args())
+
+    canvas = make_canvas(700)
+    if canvas is None:
+        print("No display, the render stage is not measured")
+    results = list()
+    for dimension in args["dimension"]:
+        for solver in args["solver"]:
+            for number_bodies in args["number_bodies"]:
+                row = benchmark_case(dimension, solver, number_bodies, args["steps"], canvas=canvas)
+                results.append(row)
+                stages = ", ".join(f"{stage} {ms:.3f} ms" for stage, ms in row["milliseconds_per_step"].items())
+                print(f"{dimension}D {solver} {number_bodies} bodies: {stages}, peak {row['peak_memory_bytes']/2**20:.1f} MiB")
+
+    with open(args["output"], "w") as file:
+        json.dump({
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "results": results,
+        }, file, indent=2)
+    print(f"Results in {args['output']}")
+    if args["compare"]:
+        with open(args["compare"]) as file:
+            old_results = json.load(file)["results"]
+        print(f"{compare(results, old_results)} regressions against {args['compare']}")
@@ -0,0 +1,126 @@
+"""
+Benchmark of the methods of reaction_diffusion.py. Every model runs up to the same simulated time with the explicit
+stencil at its largest stable timestep and with the spectral method at several multiples of it. Every run takes a
+whole number of steps and a timestep of the simulated time divided by them, so they all end at exactly that time. The
+error of each run is the relative L2 difference of v with one reference shared by both methods: the spectral method
+with a timestep ten times smaller than the one of the stencil, whose diffusion is exact and whose timestep error is
+negligible. The error of the stencil is its timestep and laplacian error together, and the benchmark reports up to
+which multiple of the timestep of the stencil the spectral method stays within it.
+With -w it measures instead the scaling of the parallel stencil: the speedup of each number of processes over the
+single process engine for the same steps, and its efficiency (speedup divided by the number of processes).
+Example:
+    python benchmark_reaction_diffusion.py -si 256 -m gray_scott -dx 0.5 -ti 1000
+    python benchmark_reaction_diffusion.py -si 8192 -m gray_scott -w 1 2 4 8 -st 100
+"""
+import math
+
+import numpy as np
+
+from reaction_diffusion import MODELS, ReactionDiffusion, run_parallel
+
+# Fraction of the stability bound of the explicit stencil, dx²/(4D), used as its timestep
+STABILITY_SAFETY = 0.9
+# The spectral method runs at these multiples of the timestep of the stencil
+SPECTRAL_MULTIPLES = (1, 2, 3, 5, 10)
+# The reference runs with the timestep of the stencil divided by this
+REFERENCE_DIVISOR = 10
+# Simulated time of every model if it is not given
+DEFAULT_TIMES = {"gray_scott": 500, "fitzhugh_nagumo": 0.5}
+
+
+def stable_dt(model, dx, **parameters):
+    """Largest timestep the explicit stencil can use"""
+    system = ReactionDiffusion((4, 4), model, dx=dx, **parameters)
+    Dv = system.Dv / system.tau if model == "fitzhugh_nagumo" else system.Dv
+    return STABILITY_SAFETY * dx**2 / (4 * max(system.Du, Dv))
+
+
+def simulate(size, model, method, steps, time, dx=1.0, seed=0, **parameters):
+    """Runs steps steps of time/steps up to the simulated time, returns v at the end and the seconds it took"""
+    system = ReactionDiffusion((size, size), model, dx=dx, dt=time/steps, method=method, **parameters)
+    system.seed(np.random.default_rng(seed))
+    seconds = system.run(steps)
+    return system.v.copy(), seconds
+
+
+def benchmark_model(size, model, time, dx=1.0, seed=0):
+    """
+    Rows (method, multiple of the timestep of the stencil, dt, steps, seconds, error) of one model. A run with a
+    multiple m takes the fewest steps whose timestep is at most m times the one of the stencil
+    """
+    dt = stable_dt(model, dx)
+    reference, _ = simulate(size, model, "spectral", math.ceil(time * REFERENCE_DIVISOR / dt), time, dx, seed)
+    rows = list()
+    for method, multiple in [("stencil", 1)] + [("spectral", multiple) for multiple in SPECTRAL_MULTIPLES]:
+        steps = math.ceil(time / (dt*multiple))
+        v, seconds = simulate(size, model, method, steps, time, dx, seed)
+        error = np.linalg.norm(v - reference) / np.linalg.norm(reference)
+        rows.append((method, multiple, time/steps, steps, seconds, error))
+    return rows
+
+
+def largest_matching_multiple(rows):
+    """The largest multiple of the timestep of the stencil at which the spectral method is at most as far from the
+    reference as the stencil, and every smaller multiple too. None if not even at the same timestep"""
+    stencil_error = rows[0][-1]
+    largest = None
+    for method, multiple, *_, error in rows[1:]:
+        if error > stencil_error:
+            break
+        largest = multiple
+    return largest
+
+
+def benchmark_scaling(size, model, steps, workers, seed=0):
+    """
+    Rows (processes, seconds, speedup, efficiency, difference) of the parallel stencil against the single process
+    engine, the first row. difference is the largest absolute difference of v with the single process run
+    """
+    system = ReactionDiffusion((size, size), model)
+    system.seed(np.random.default_rng(seed))
+    serial = system.run(steps)
+    reference = system.v.copy()
+    rows = [(1, serial, 1.0, 1.0, 0.0)]
+    for processes in workers:
+        system = ReactionDiffusion((size, size), model)
+        system.seed(np.random.default_rng(seed))
+        seconds = run_parallel(system, steps, processes)
+        speedup = serial / seconds
+        rows.append((processes, seconds, speedup, speedup / processes, np.abs(system.v - reference).max()))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Time and timestep error of the stencil and spectral reaction diffusion")
+
+    # Add arguments to the parser
+    all_args.add_argument("-si", "--size", type=int, default=128, help="Rows and columns of the grid")
+    all_args.add_argument("-m", "--model", nargs="+", choices=tuple(MODELS), default=list(MODELS), help="Models to compare")
+    all_args.add_argument("-dx", "--dx", type=float, default=1.0, help="Grid spacing, a finer grid lowers the stable timestep of the stencil")
+    all_args.add_argument("-ti", "--time", type=float, default=None, help="Simulated time, by default 500 for Gray-Scott and 0.5 for FitzHugh-Nagumo")
+    all_args.add_argument("-se", "--seed", type=int, default=0, help="Seed of the initial state")
+    all_args.add_argument("-w", "--workers", type=int, nargs="+", default=None, help="Measure the scaling of the parallel stencil with these numbers of processes instead")
+    all_args.add_argument("-st", "--steps", type=int, default=100, help="Steps of the scaling runs")
+    args = vars(all_args.parse_args())
+
+    for model in args["model"]:
+        if args["workers"]:
+            print(f"{model}, {args['size']}x{args['size']}, {args['steps']} steps of the stencil")
+            (_, serial, *_), *rows = benchmark_scaling(args["size"], model, args["steps"], args["workers"], args["seed"])
+            print(f"  single process: {serial:.2f} s")
+            for processes, seconds, speedup, efficiency, difference in rows:
+                print(f"  {processes:>3} processes: {seconds:.2f} s, speedup {speedup:.2f}, efficiency {efficiency:.0%}, max difference {difference:.1e}")
+            continue
+        time = args["time"] or DEFAULT_TIMES[model]
+        print(f"{model}, {args['size']}x{args['size']}, dx = {args['dx']}, simulated time {time}")
+        rows = benchmark_model(args["size"], model, time, args["dx"], args["seed"])
+        for method, multiple, dt, steps, seconds, error in rows:
+            print(f"  {method:>8} dt = {dt:.3g} (x{multiple}): {steps} steps in {seconds:.2f} s, error {error:.2e}")
+        largest = largest_matching_multiple(rows)
+        if largest is None:
+            print(f"  the spectral method is not within the error of the stencil, {rows[0][-1]:.2e}, at any timestep")
+        else:
+            print(f"  the spectral method stays within the error of the stencil, {rows[0][-1]:.2e}, up to x{largest} its timestep")
@@ -0,0 +1,159 @@
+"""
+Micro-benchmarks of spatial_index.py against the brute-force scans it replaces. For every dimension and number of
+spheres it times the four operations of the index and their brute-force version, and checks that both find the same:
+  - pairs: every overlapping pair with pairs_within, against the distance of every pair (in blocks of rows)
+  - between: every overlap of query spheres with the set with overlapping_between, against every query to every sphere
+  - insert: inserting the spheres one by one into a SpatialIndex, against appending them to a list. The index only
+    adds finding the cell of every sphere to the append, which is what the query saves hundreds of times over
+  - query: is_overlapping of the index for every query sphere, against a loop over every sphere with overlaps, as
+    Circle.is_any_overlapping does
+The spheres are spread uniformly in a box that grows with their number, so every sphere has the same number of
+neighbours whatever the size. With a spread, half of the spheres and of the queries are moved that far along every
+axis, a spread of 1e12 makes a grid with more cells than int64 keys can number.
+Example:
+    python benchmark_spatial_index.py -nb 1000 10000 -di 2 3 -qu 1000
+"""
+from time import perf_counter
+
+import numpy as np
+
+from spatial_index import SpatialIndex, overlapping_between, overlaps, pairs_within
+
+# Rows of the brute force pair distances computed at once, so the (block, N) temporaries stay small
+BRUTE_BLOCK_SIZE = 2**20
+# Fraction of the box filled by the spheres
+VOLUME_FRACTION = 0.2
+# The brute force query loops in Python are only timed up to this many spheres times queries
+BRUTE_LOOP_LIMIT = 10**6
+
+
+def random_spheres(number, dimension, rng, box=None):
+    """Positions and radii (uniform between 0.5 and 1.5) of spheres in a box that they fill in VOLUME_FRACTION"""
+    radii = rng.uniform(0.5, 1.5, number)
+    if box is None:
+        box = (number * 2**dimension / VOLUME_FRACTION)**(1 / dimension)
+    return rng.uniform(0, box, (number, dimension)), radii, box
+
+
+def brute_pairs_within(positions, radii, margin=0):
+    """Pairs (i, j), i < j, of overlapping spheres from the distance of every pair"""
+    number = len(positions)
+    block = max(1, BRUTE_BLOCK_SIZE // max(1, number))
+    pairs_i, pairs_j = list(), list()
+    for start in range(0, number, block):
+        stop = min(start + block, number)
+        difference = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        squared = np.einsum("ijk,ijk->ij", difference, difference)
+        touching = squared <= (radii[start:stop, np.newaxis] + radii[np.newaxis, :] + margin)**2
+        i, j = np.nonzero(touching)
+        i += start
+        keep = i < j
+        pairs_i.append(i[keep])
+        pairs_j.append(j[keep])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def brute_overlapping_between(query_positions, query_radii, positions, radii):
+    """Pairs (q, i) of a query sphere q that overlaps the sphere i, from the distance of every pair"""
+    block = max(1, BRUTE_BLOCK_SIZE // max(1, len(positions)))
+    pairs_q, pairs_i = list(), list()
+    for start in range(0, len(query_positions), block):
+        stop = min(start + block, len(query_positions))
+        difference = positions[np.newaxis, :, :] - query_positions[start:stop, np.newaxis, :]
+        squared = np.einsum("ijk,ijk->ij", difference, difference)
+        q, i = np.nonzero(squared <= (query_radii[start:stop, np.newaxis] + radii[np.newaxis, :])**2)
+        pairs_q.append(q + start)
+        pairs_i.append(i)
+    return np.concatenate(pairs_q), np.concatenate(pairs_i)
+
+
+def same_pairs(a, b):
+    """If two sets of pairs are the same, in any order"""
+    return set(zip(*(part.tolist() for part in a))) == set(zip(*(part.tolist() for part in b)))
+
+
+def timed(function, *args):
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
+
+
+def benchmark_case(number, dimension, queries, seed=0, spread=None):
+    """Rows (operation, index seconds, brute force seconds or None, same result) of one case"""
+    rng = np.random.default_rng(seed)
+    positions, radii, box = random_spheres(number, dimension, rng)
+    query_positions, query_radii, _ = random_spheres(queries, dimension, rng, box)
+    if spread:
+        positions[number // 2:] += spread
+        query_positions[queries // 2:] += spread
+    rows = list()
+
+    pairs, seconds = timed(pairs_within, positions, radii)
+    brute, brute_seconds = timed(brute_pairs_within, positions, radii)
+    rows.append(("pairs", seconds, brute_seconds, same_pairs(pairs, brute)))
+
+    between, seconds = timed(overlapping_between, query_positions, query_radii, positions, radii)
+    brute, brute_seconds = timed(brute_overlapping_between, query_positions, query_radii, positions, radii)
+    rows.append(("between", seconds, brute_seconds, same_pairs(between, brute)))
+
+    def insert_all():
+        index = SpatialIndex(2 * radii.max(), dimension)
+        for position, radius in zip(positions.tolist(), radii.tolist()):
+            index.insert(position, radius)
+        return index
+
+    def append_all():
+        spheres = list()
+        for position, radius in zip(positions.tolist(), radii.tolist()):
+            spheres.append((position, radius))
+        return spheres
+
+    index, seconds = timed(insert_all)
+    spheres, brute_seconds = timed(append_all)
+    rows.append(("insert", seconds, brute_seconds, len(index) == len(spheres)))
+
+    def query_index():
+        return [
+            index.is_overlapping(position, radius)
+            for position, radius in zip(query_positions.tolist(), query_radii.tolist())
+        ]
+
+    def query_brute():
+        return [
+            any(overlaps(position, radius, other, other_radius) for other, other_radius in spheres)
+            for position, radius in zip(query_positions.tolist(), query_radii.tolist())
+        ]
+
+    found, seconds = timed(query_index)
+    if number * queries <= BRUTE_LOOP_LIMIT:
+        brute, brute_seconds = timed(query_brute)
+        rows.append(("query", seconds, brute_seconds, found == brute))
+    else:
+        # Too slow to wait for, the answers are checked against the bulk query instead
+        expected = np.zeros(queries, dtype=bool)
+        expected[between[0]] = True
+        rows.append(("query", seconds, None, found == expected.tolist()))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Times the spatial index against brute force")
+
+    # Add arguments to the parser
+    all_args.add_argument("-nb", "--number_spheres", type=int, nargs="+", default=[100, 1000, 10000], help="Numbers of spheres")
+    all_args.add_argument("-di", "--dimension", type=int, nargs="+", choices=(2, 3), default=[2, 3], help="Dimensions")
+    all_args.add_argument("-qu", "--queries", type=int, default=1000, help="Query spheres of the between and query operations")
+    all_args.add_argument("-se", "--seed", type=int, default=0, help="Seed of the spheres")
+    all_args.add_argument("-sp", "--spread", type=float, default=None, help="Move half of the spheres this far along every axis")
+    args = vars(all_args.parse_args())
+
+    for dimension in args["dimension"]:
+        for number in args["number_spheres"]:
+            print(f"{dimension}D, {number} spheres, {args['queries']} queries")
+            for operation, seconds, brute_seconds, same in benchmark_case(number, dimension, args["queries"], args["seed"], args["spread"]):
+                brute = f"{brute_seconds*1000:9.2f} ms" if brute_seconds is not None else "  skipped"
+                speedup = f"x{brute_seconds/seconds:.1f}" if brute_seconds is not None else ""
+                print(f"  {operation:>7}: index {seconds*1000:8.2f} ms, brute force {brute} {speedup:>7}, {'same' if same else 'DIFFERENT'}")
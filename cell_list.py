@@ -0,0 +1,15 @@
+"""
+Uniform grid (cell list) broad phase for the collisions between bodies. The space is divided in cells as big as the
+largest distance at which two bodies can collide, so a body can only collide with the bodies in its own cell and in the
+neighbouring ones. Only those candidates have their distance computed, instead of every pair. The grid is the one of
+spatial_index.py, shared with the colorblind plate generator.
+"""
+from spatial_index import pairs_within
+
+
+def close_pairs(positions, radii, margin=0):
+    """
+    Finds every pair of bodies whose distance is less than the sum of their radii plus the margin.
+    Returns two index arrays (i, j) with i < j, one element per colliding pair
+    """
+    return pairs_within(positions, radii, margin, inclusive=False)
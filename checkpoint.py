@@ -0,0 +1,73 @@
+"""
+Checkpoints of the many body simulations. A checkpoint holds the full state of a BodySystem (see many_body_core.py):
+the arrays, the box, the step counter T, the simulated time, the options of the solver and the integrator, and the
+state of the random generator. Loading it and stepping gives exactly the same numbers as the run that saved it, so long
+runs can be stopped and resumed, or extended.
+"""
+import json
+import os
+
+import numpy as np
+
+from many_body_core import BodySystem
+
+
+def save_checkpoint(path, system, rng=None):
+    """
+    Saves the state to a compressed .npz file. The file is written under another name and then renamed, so a run that
+    is killed while saving never leaves a broken checkpoint behind
+    """
+    rng_state = json.dumps(rng.bit_generator.state) if rng is not None else ""
+    temporary = f"{path}.tmp"
+    # Use a file object, with a name np.savez would add .npz to the temporary name
+    with open(temporary, "wb") as file:
+        np.savez_compressed(
+            file,
+            masses=system.masses,
+            positions=system.positions,
+            velocities=system.velocities,
+            box=system.box,
+            T=system.T,
+            time=system.time,
+            solver=system.solver,
+            theta=system.theta,
+            integrator=system.integrator,
+            dt=system.dt,
+            adaptive=system.adaptive,
+            rng_state=rng_state
+        )
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """Returns the BodySystem and the random generator (None if it was not saved) of a checkpoint"""
+    with np.load(path) as data:
+        system = BodySystem(
+            data["masses"], data["positions"], data["velocities"], data["box"],
+            solver=str(data["solver"]),
+            theta=float(data["theta"]),
+            integrator=str(data["integrator"]),
+            dt=float(data["dt"]),
+            adaptive=bool(data["adaptive"]),
+            dtype=data["positions"].dtype
+        )
+        system.T = int(data["T"])
+        system.time = float(data["time"])
+        rng_state = str(data["rng_state"])
+    rng = None
+    if rng_state:
+        rng = np.random.default_rng()
+        rng.bit_generator.state = json.loads(rng_state)
+    return system, rng
+
+
+class Checkpointer:
+    """A consumer of a Simulation that saves a checkpoint every given number of steps"""
+    def __init__(self, path, every=1000, rng=None):
+        self.path = path
+        self.every = max(1, every)
+        self.rng = rng
+
+    def __call__(self, system):
+        if system.T % self.every == 0:
+            save_checkpoint(self.path, system, self.rng)
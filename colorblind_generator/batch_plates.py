@@ -0,0 +1,137 @@
+"""
+Batch generation of colorblind plates for a test bank. Every plate is a job (mask, palette, layout, number of circles
+and seed) and the jobs are spread over a pool of processes, one per core by default. The seeds are spawned from a
+single root seed with np.random.SeedSequence, so the same command always gives the same plates whatever the number of
+processes or the order they finish in. Each worker decodes each mask once and keeps it for all its jobs (the jobs
+cycle through the masks, so the small cache of get_array_from_image would drop a mask before it comes round again
+when there are many), and every plate is saved as soon as it is done; plates.csv lists the plates with their job as
+they finish.
+Example:
+    python batch_plates.py masks bank -n 1000 -pa original red_green -la poisson -se 0
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import cycle, islice, product
+from time import perf_counter
+
+import numpy as np
+
+import circles_in_circle
+from make_plates import find_masks
+
+# Columns of plates.csv
+FIELDS = ("plate", "mask", "palette", "layout", "number_of_circles", "circles", "seed_entropy", "spawn_key", "seconds")
+
+# Masks already decoded by this worker process
+mask_cache = dict()
+
+
+def load_mask(path):
+    """The array of a mask, decoded only the first time a worker needs it"""
+    if path not in mask_cache:
+        mask_cache[path] = circles_in_circle.get_array_from_image(path)
+    return mask_cache[path]
+
+
+def run_job(job):
+    """Makes and saves one plate, this is what every worker process executes"""
+    start = perf_counter()
+    circles = circles_in_circle.main_init(
+        job["number_of_circles"], job["radius"], layout=job["layout"], mask=load_mask(job["mask"]),
+        palette=job["palette"], verbose=False, samples=job["samples"],
+        rng=np.random.default_rng(job["seed"])
+    )
+    circles_in_circle.render_plate(circles, job["size"], job["supersample"]).save(job["path"])
+    return {
+        "plate": os.path.basename(job["path"]),
+        "mask": job["mask"],
+        "palette": job["palette"],
+        "layout": job["layout"],
+        "number_of_circles": job["number_of_circles"],
+        "circles": len(circles),
+        "seed_entropy": job["seed"].entropy,
+        "spawn_key": ":".join(map(str, job["seed"].spawn_key)),
+        "seconds": perf_counter() - start,
+    }
+
+
+def make_jobs(
+    masks, plates, output, palettes=("original",), layout="rejection", number_of_circles=3000, radius=7,
+    size=circles_in_circle.PLATE_SIZE, supersample=1, seed=None, samples=1
+):
+    """
+    plates jobs that go through every combination of mask and palette in turn, each with its own seed spawned from
+    the root one. The plates are saved to the output directory as plate_00001.png and so on
+    """
+    combinations = islice(cycle(product(masks, palettes)), plates)
+    seeds = np.random.SeedSequence(seed).spawn(plates)
+    jobs = list()
+    for number, ((mask, palette), job_seed) in enumerate(zip(combinations, seeds), start=1):
+        jobs.append({
+            "mask": mask,
+            "palette": palette,
+            "layout": layout,
+            "number_of_circles": number_of_circles,
+            "radius": radius,
+            "size": size,
+            "supersample": supersample,
+            "samples": samples,
+            "seed": job_seed,
+            "path": os.path.join(output, f"plate_{number:05d}.png"),
+        })
+    return jobs
+
+
+def run_batch(jobs, output, workers=None):
+    """
+    Runs the jobs in a process pool. The workers save the plates themselves and every finished plate is added to
+    plates.csv right away, so an interrupted batch keeps what it made. Returns the rows of plates.csv
+    """
+    os.makedirs(output, exist_ok=True)
+    results = list()
+    with open(os.path.join(output, "plates.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(run_job, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                writer.writerow(result)
+                file.flush()
+                results.append(result)
+                print(f"{done}/{len(jobs)} plates, {result['plate']}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Makes many colorblind plates in parallel from a directory of masks")
+
+    # Add arguments to the parser
+    all_args.add_argument("masks", help="Directory with the masks, black text on a white background")
+    all_args.add_argument("output", help="Directory the plates are saved to")
+    all_args.add_argument("-n", "--plates", type=int, default=100, help="Number of plates, the masks and palettes are used in turn")
+    all_args.add_argument("-pa", "--palette", nargs="+", choices=tuple(circles_in_circle.PALETTES), default=["original"], help="Palettes to use")
+    all_args.add_argument("-la", "--layout", choices=tuple(circles_in_circle.LAYOUTS), default="rejection", help="Algorithm that places the circles")
+    all_args.add_argument("-nc", "--number_of_circles", type=int, default=3000, help="How many circles to place in every plate")
+    all_args.add_argument("-ra", "--radius", type=int, default=7, help="Radius of the first circles")
+    all_args.add_argument("-si", "--size", type=int, default=circles_in_circle.PLATE_SIZE, help="Size in pixels of the plates")
+    all_args.add_argument("-ss", "--supersample", type=int, default=1, help="Draw the plates this many times bigger and reduce them, for antialiasing")
+    all_args.add_argument("-sa", "--samples", type=int, default=1, help="Points of the mask read over the area of each circle")
+    all_args.add_argument("-se", "--seed", type=int, default=None, help="Root seed the seeds of all the plates are spawned from")
+    all_args.add_argument("-w", "--workers", type=int, default=None, help="Processes of the pool, one per core by default")
+    args = vars(all_args.parse_args())
+
+    masks = find_masks(args["masks"])
+    if not masks:
+        raise SystemExit(f"No images in {args['masks']}")
+    jobs = make_jobs(
+        masks, args["plates"], args["output"], args["palette"], args["layout"], args["number_of_circles"],
+        args["radius"], args["size"], args["supersample"], args["seed"], args["samples"]
+    )
+    start = perf_counter()
+    run_batch(jobs, args["output"], args["workers"])
+    print(f"{len(jobs)} plates in {perf_counter() - start:.1f} s, listed in {os.path.join(args['output'], 'plates.csv')}")
@@ -0,0 +1,64 @@
+"""
+Compares the layouts of circles_in_circle.py: the rejection loop with a shrinking radius and the Poisson-disk sampling.
+For every layout and seed it reports how many circles were placed, the packing density (area of the circles over the
+area of the big circle) and the time it took. It fails if any circles overlap or if a layout leaves part of the big
+circle empty, which shows as a density under MINIMUM_DENSITY: the plates need the whole circle covered to hide the text.
+Example:
+    python benchmark_layouts.py -nc 3000 20000 -se 0 1 2
+"""
+from time import perf_counter
+
+import numpy as np
+
+import circles_in_circle
+
+# Packing density that a layout must reach to count as covering the big circle, both layouts get about 0.6
+MINIMUM_DENSITY = 0.5
+
+def benchmark_layout(layout, number_of_circles, seed, current_radius=7, minimum_radius=1):
+    """
+    Places the circles with one layout, returns the number of circles, the packing density, the seconds and the
+    number of overlapping pairs
+    """
+    rng = np.random.default_rng(seed)
+    start = perf_counter()
+    # The rejection layout would print in the middle of the table when the radius gets too small
+    options = {"verbose": False} if layout == "rejection" else {}
+    circles = circles_in_circle.LAYOUTS[layout](number_of_circles, current_radius, minimum_radius, rng=rng, **options)
+    seconds = perf_counter() - start
+    density = np.sum(circles.radii**2) / circles_in_circle.BIG_CIRCLE_RADIUS**2
+    overlaps = circles.overlapping_pairs()[0].size
+    return len(circles), density, seconds, overlaps
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Circle count, packing density and time of the layouts of the colorblind generator")
+
+    # Add arguments to the parser
+    all_args.add_argument("-nc", "--number_of_circles", type=int, nargs="+", default=[3000], help="Circles asked for")
+    all_args.add_argument("-la", "--layout", nargs="+", choices=tuple(circles_in_circle.LAYOUTS), default=list(circles_in_circle.LAYOUTS), help="Layouts to compare")
+    all_args.add_argument("-se", "--seed", type=int, nargs="+", default=[0, 1, 2], help="Seeds, the results are averaged over them")
+    all_args.add_argument("-ra", "--radius", type=int, default=7, help="Radius of the first circles, the maximum of the Poisson-disk layout")
+    all_args.add_argument("-mr", "--minimum_radius", type=int, default=1, help="Minimum radius")
+    all_args.add_argument("-md", "--minimum_density", type=float, default=MINIMUM_DENSITY, help="Density under which a layout fails for leaving the big circle uncovered")
+    args = vars(all_args.parse_args())
+
+    failures = list()
+    for number_of_circles in args["number_of_circles"]:
+        for layout in args["layout"]:
+            results = np.array([
+                benchmark_layout(layout, number_of_circles, seed, args["radius"], args["minimum_radius"])
+                for seed in args["seed"]
+            ])
+            count, density, seconds, overlaps = results.mean(axis=0)
+            print(
+                f"{layout:>9}, {number_of_circles} asked: {count:.0f} circles, density {density:.3f}, "
+                f"{seconds*1000:.1f} ms, {overlaps:.0f} overlapping pairs"
+            )
+            if overlaps > 0 or density < args["minimum_density"]:
+                failures.append(f"{layout} with {number_of_circles} circles")
+    if failures:
+        raise SystemExit(f"Overlapping circles or density under {args['minimum_density']}: {', '.join(failures)}")
@@ -0,0 +1,72 @@
+"""
+Turns a directory of masks (black text on a white background) into numbered colorblind plates, without any window.
+The masks are taken in alphabetical order and the plates are saved as plate_0001.png, plate_0002.png... in the output
+directory, with a plates.csv that tells which mask each plate hides.
+Example:
+    python make_plates.py masks plates -la poisson -si 1800 -ss 2 -se 0
+"""
+import csv
+import os
+
+import numpy as np
+
+import circles_in_circle
+
+# Images that are taken as masks
+MASK_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+
+def find_masks(directory):
+    """Paths of the images of the directory, in alphabetical order"""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(MASK_EXTENSIONS))
+    return [os.path.join(directory, name) for name in names]
+
+
+def make_plates(masks, output, size=circles_in_circle.PLATE_SIZE, supersample=1, seed=None, **options):
+    """
+    Makes one plate per mask and saves it to the output directory. The options (number_of_circles, current_radius,
+    layout...) go to main_init. Returns the paths of the plates
+    """
+    os.makedirs(output, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    plates = list()
+    for number, mask in enumerate(masks, start=1):
+        circles = circles_in_circle.main_init(mask=mask, rng=rng, **options)
+        path = os.path.join(output, f"plate_{number:04d}.png")
+        circles_in_circle.render_plate(circles, size, supersample).save(path)
+        plates.append(path)
+        print(f"{mask} -> {path}")
+    with open(os.path.join(output, "plates.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("plate", "mask"))
+        writer.writerows(zip((os.path.basename(path) for path in plates), masks))
+    return plates
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Makes a numbered colorblind plate from every mask of a directory")
+
+    # Add arguments to the parser
+    all_args.add_argument("masks", help="Directory with the masks, black text on a white background")
+    all_args.add_argument("output", help="Directory the plates are saved to")
+    all_args.add_argument("-nc", "--number_of_circles", type=int, default=3000, help="How many circles to place")
+    all_args.add_argument("-ra", "--radius", type=int, default=7, help="Radius of the first circles")
+    all_args.add_argument("-mr", "--minimum_radius", type=int, default=1, help="The radius is reduced until this number is reached")
+    all_args.add_argument("-la", "--layout", choices=tuple(circles_in_circle.LAYOUTS), default="rejection", help="Algorithm that places the circles")
+    all_args.add_argument("-si", "--size", type=int, default=circles_in_circle.PLATE_SIZE, help="Size in pixels of the plates")
+    all_args.add_argument("-ss", "--supersample", type=int, default=1, help="Draw the plates this many times bigger and reduce them, for antialiasing")
+    all_args.add_argument("-se", "--seed", type=int, default=None, help="Seed of the random circles")
+    args = vars(all_args.parse_args())
+
+    masks = find_masks(args["masks"])
+    if not masks:
+        raise SystemExit(f"No images in {args['masks']}")
+    make_plates(
+        masks, args["output"], args["size"], args["supersample"], args["seed"],
+        number_of_circles=args["number_of_circles"], current_radius=args["radius"],
+        minimum_radius=args["minimum_radius"], layout=args["layout"]
+    )
+    print(f"{len(masks)} plates in {args['output']}")
@@ -1,97 +1,219 @@
 import numpy as np
 import datetime as dt
+import sqlite3
+from time import perf_counter
 from colorama import init, Fore, Back, Style
 
 rng = np.random.default_rng()
 # Necesary for the module to work in windows
 init()
 
-def random_date():
-    """Returns a random date as a tuple (year, month, day) with all days equaly likely"""
-    rand_year, rand_month = rng.integers((0, 1), (3000, 12))
-    # Leap year
-    if rand_year % 4 == 0 and rand_month == 2:
-        rand_day = rng.integers(1, 29)
-        return (rand_year, rand_month, rand_day)
-    # Not leap year, february
-    if rand_month == 2:
-        rand_day = rng.integers(1, 28)
-        return (rand_year, rand_month, rand_day)
-    # Months with 30 days
-    if rand_month in (4, 6, 9, 11):
-        rand_day = rng.integers(1, 30)
-        return (rand_year, rand_month, rand_day)
-    # Else
-    rand_day = rng.integers(1, 31)
-    return (rand_year, rand_month, rand_day)
-
-def look_points():
-    """Looks up the wins and losses of the player"""
-    with open("score.txt", "r") as score:
-        # score.txt consist of two numbers, the recorded wins and the recorded losses.
-        # A win is getting the day right and a loss is the opposite
-        wins, losses = score.read().split(",")
-        return (int(wins), int(losses))
-
-def update_points(is_win: bool):
-    """Updates the points depending if the condition is win (True) or loss (false)"""
-    wins, losses = look_points()
-    # Update values
-    if is_win:
-        wins += 1
-    else:
-        losses += 1
-    with open("score.txt", "w") as score:
-        # score.txt consist of two numbers, the recorded wins and the recorded losses.
-        # A win is getting the day right and a loss is the opposite
-        score.write(f"{wins},{losses}")
+# Days of the calendar the dates are drawn from, the first day of FIRST_YEAR to the last one of LAST_YEAR
+FIRST_YEAR, LAST_YEAR = 0, 2999
+# The date 0 of datetime64 (1970-01-01) was a thursday
+EPOCH_WEEKDAY = 4
+# Number of questions drawn at once by questions
+QUESTION_BATCH = 1000
+# Database with every answer and the wins and losses, and the answers kept in memory before writing them to it
+LOG_PATH = "results.sqlite"
+LOG_BATCH = 20
 
-def create_date():
-    """Creates the random date"""
-    # I know that this is not the best way
-    #rand_year, rand_month, rand_day = rng.integers((0, 1, 1), (3000, 12, 31))# rng.integers(0, 3000), rng.integers(1, 12), rng.integers(1, 31)
-    
-    rand_year, rand_month, rand_day = random_date()
-
-    date_object = dt.date(rand_year, rand_month, rand_day)
-    #print(date_object.weekday())
-    return rand_year, rand_month, rand_day, date_object
-
-def get_answer(rand_year, rand_month, rand_day, date_object):
-    """Asks the question and handles the response"""
-    print(f"Date: {date_object} or {rand_day} of {months_num_to_name[rand_month]} of {rand_year}")
-    # If you want to cheat you can uncomment the line below and coment the other print, this will the answer in black next to the question
-    #print(f"{Back.BLACK}What day of the week was that, by name?{Fore.BLACK}{date_object.weekday()+1}{Style.RESET_ALL} ")
-    print(f"What day of the week was that, by name?")
-    answer = input().capitalize()
-    if answer == "Stop" or answer == "Exit":
-        print("Program stopped")
-        wins, losses = look_points()
-        print(f"{Fore.GREEN}Wins: {wins}, {Fore.RED}Losses: {losses}{Style.RESET_ALL}")
-        exit()
+def random_dates(number, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    """Returns number random dates between both years (included) as datetime64[D], with all days equaly likely"""
+    first_day = np.datetime64(f"{first_year:04d}-01-01", "D").astype(np.int64)
+    last_day = np.datetime64(f"{last_year + 1:04d}-01-01", "D").astype(np.int64)
+    return rng.integers(first_day, last_day, number).astype("datetime64[D]")
+
+def split_dates(dates):
+    """Years, months and days of an array of datetime64[D]"""
+    months = dates.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_numbers = months.astype(np.int64) % 12 + 1
+    days = (dates - months.astype("datetime64[D]")).astype(np.int64) + 1
+    return years, month_numbers, days
+
+def weekdays(dates):
+    """Day of the week of an array of datetime64[D], with 0 sunday, 1 monday... 6 saturday"""
+    return (dates.astype(np.int64) + EPOCH_WEEKDAY) % 7
+
+def doomsdays(dates):
+    """Doomsday of the year of every date (the day of the week of the 4th of April, 4/4), numbered as in weekdays"""
+    march_first = dates.astype("datetime64[Y]").astype("datetime64[M]") + np.timedelta64(2, "M")
+    # The last day of february is always a doomsday, 4/4 is five weeks later
+    return weekdays(march_first.astype("datetime64[D]") - np.timedelta64(1, "D"))
+
+def questions(batch=QUESTION_BATCH):
+    """
+    Endless questions (year, month, day, weekday, doomsday). The dates and their answers are computed batch at a
+    time, so asking a question is only taking the next one
+    """
+    while True:
+        dates = random_dates(batch)
+        yield from zip(*split_dates(dates), weekdays(dates), doomsdays(dates))
+
+def check_dates(first_year=1, last_year=LAST_YEAR):
+    """
+    Compares every day between both years with datetime: split_dates, weekdays and doomsdays must give the same.
+    datetime starts in the year 1, the year 0 is checked with the year 400 instead, as the calendar repeats every 400
+    years (146097 days, a whole number of weeks). Returns the number of days checked
+    """
+    first_day = np.datetime64(f"{first_year:04d}-01-01", "D")
+    dates = np.arange(first_day, np.datetime64(f"{last_year + 1:04d}-01-01", "D"))
+    years, months, days = split_dates(dates)
+    week, doomsday = weekdays(dates), doomsdays(dates)
+    date_object = dt.date(first_year, 1, 1)
+    for index in range(len(dates)):
+        expected = (date_object.year, date_object.month, date_object.day, (date_object.weekday() + 1) % 7,
+                    (dt.date(date_object.year, 4, 4).weekday() + 1) % 7)
+        found = (years[index], months[index], days[index], week[index], doomsday[index])
+        if found != expected:
+            raise AssertionError(f"{dates[index]}: {found} instead of {expected}")
+        date_object += dt.timedelta(days=1)
+    year_zero = np.arange(np.datetime64("0000-01-01", "D"), np.datetime64("0001-01-01", "D"))
+    year_400 = year_zero + np.timedelta64(146097, "D")
+    if not (np.array_equal(weekdays(year_zero), weekdays(year_400))
+            and np.array_equal(doomsdays(year_zero), doomsdays(year_400))
+            and np.array_equal(split_dates(year_zero)[2], split_dates(year_400)[2])):
+        raise AssertionError("The year 0 does not match the year 400")
+    return len(dates) + len(year_zero)
+
+class ResultLog:
+    """
+    Record of the answers in a SQLite database. Every answer (when, the date asked, the day answered, if it was right
+    and how many seconds it took) is kept in memory and written with the others batch at a time to the table answers,
+    which is only appended to. The table score holds the wins and losses and is updated in the same transaction, so
+    they never have to be counted again
+    """
+    def __init__(self, path=LOG_PATH, batch=LOG_BATCH):
+        self.batch = batch
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers "
+                "(timestamp TEXT, date TEXT, weekday INTEGER, answer INTEGER, correct INTEGER, latency REAL)"
+            )
+            self.connection.execute("CREATE TABLE IF NOT EXISTS score (wins INTEGER, losses INTEGER)")
+            if self.connection.execute("SELECT COUNT(*) FROM score").fetchone()[0] == 0:
+                self.connection.execute("INSERT INTO score VALUES (0, 0)")
+        self.wins, self.losses = self.connection.execute("SELECT wins, losses FROM score").fetchone()
+        self.pending = list()
+
+    def add(self, date, weekday, answer, latency):
+        """Records one answer, a win if the day is right and a loss if not"""
+        correct = answer == weekday
+        if correct:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.pending.append((dt.datetime.now().isoformat(), date, int(weekday), int(answer), int(correct), latency))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """Writes the answers kept in memory and the new score"""
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+            self.connection.execute("UPDATE score SET wins = ?, losses = ?", (self.wins, self.losses))
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def latency_stats(path=LOG_PATH, by="weekday"):
+    """
+    Answers, mean, fastest and slowest latency in seconds and fraction of right answers, grouped by the day of the week
+    of the dates (by="weekday"), by their month (by="month") or by their century (by="century")
+    """
+    groups = {
+        "weekday": "weekday",
+        "month": "CAST(substr(date, 6, 2) AS INTEGER)",
+        "century": "CAST(substr(date, 1, 4) AS INTEGER) / 100",
+    }
+    connection = sqlite3.connect(path)
     try:
-        days_name_to_num[answer]
-    except KeyError:
-        print("I do not understand that. A spelling error? Input stop or the day of the week you think it is in lower case")
-        get_answer(rand_year, rand_month, rand_day, date_object)
-    else:
-        if days_name_to_num[answer] == (date_object.weekday()+1) % 7:
-            doomsday = (dt.date(rand_year, 4, 4).weekday() + 1) % 7
-            print(f"{Fore.GREEN}Correct! The doomsday of that year was a {days_num_to_name[doomsday]} ({doomsday}) so {date_object} was a {answer}{Style.RESET_ALL}")
-            update_points(is_win=True)
-            wins, losses = look_points()
-            print(f"{Fore.GREEN}Wins: {wins}, {Fore.RED}Losses: {losses}{Style.RESET_ALL}")
-            year, month, day, date_obj = create_date()
-            get_answer(year, month, day, date_obj)
+        return connection.execute(
+            f"SELECT {groups[by]} AS grouped, COUNT(*), AVG(latency), MIN(latency), MAX(latency), AVG(correct) "
+            "FROM answers GROUP BY grouped ORDER BY grouped"
+        ).fetchall()
+    finally:
+        connection.close()
+
+def create_date():
+    """Takes the next random date from the precomputed questions"""
+    return next(question_queue)
+
+def print_points(log):
+    print(f"{Fore.GREEN}Wins: {log.wins}, {Fore.RED}Losses: {log.losses}{Style.RESET_ALL}")
+
+def quiz(log):
+    """Asks questions until the player writes stop or exit. A wrong answer asks the same date again"""
+    rand_year, rand_month, rand_day, weekday, doomsday = create_date()
+    while True:
+        date = f"{rand_year:04d}-{rand_month:02d}-{rand_day:02d}"
+        print(f"Date: {date} or {rand_day} of {months_num_to_name[rand_month]} of {rand_year}")
+        # If you want to cheat you can uncomment the line below and coment the other print, this will the answer in black next to the question
+        #print(f"{Back.BLACK}What day of the week was that, by name?{Fore.BLACK}{weekday}{Style.RESET_ALL} ")
+        print(f"What day of the week was that, by name?")
+        start = perf_counter()
+        try:
+            answer = input().capitalize()
+        except EOFError:
+            answer = "Stop"
+        latency = perf_counter() - start
+        if answer == "Stop" or answer == "Exit":
+            print("Program stopped")
+            print_points(log)
+            return
+        if answer not in days_name_to_num:
+            print("I do not understand that. A spelling error? Input stop or the day of the week you think it is in lower case")
+            continue
+        log.add(date, weekday, days_name_to_num[answer], latency)
+        if days_name_to_num[answer] == weekday:
+            print(f"{Fore.GREEN}Correct! The doomsday of that year was a {days_num_to_name[doomsday]} ({doomsday}) so {date} was a {answer}{Style.RESET_ALL}")
+            print_points(log)
+            rand_year, rand_month, rand_day, weekday, doomsday = create_date()
         else:
             print(f"{Fore.RED}Incorrect{Style.RESET_ALL}")
-            update_points(is_win=False)
-            get_answer(rand_year, rand_month, rand_day, date_object)
+
+question_queue = questions()
 
 if __name__ == "__main__":
-    print("To exit the program, write stop or exit")
-    months_num_to_name = {1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June"	, 7: "July"	, 8: "August", 9: "September", 10: "October", 11: "November", 12: "December"}
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Asks the day of the week of random dates, to practice the doomsday rule")
+
+    # Add arguments to the parser
+    all_args.add_argument("-ch", "--check", action="store_true", help="Check the dates and answers against datetime from the year 0 to 2999 and exit")
+    all_args.add_argument("-st", "--stats", choices=("weekday", "month", "century"), default=None, help="Print the latency of the recorded answers grouped this way and exit")
+    all_args.add_argument("-db", "--database", default=LOG_PATH, help="SQLite file the answers are recorded in")
+    all_args.add_argument("-dr", "--drill", type=int, default=0, help="Print this many dates with their answers and exit")
+    args = vars(all_args.parse_args())
+
+    if args["check"]:
+        print(f"{check_dates()} days checked, all correct")
+        exit()
     days_num_to_name = {0: "Sunday", 1:"Monday", 2:"Tuesday", 3:"Wednesday", 4:"Thursday", 5:"Friday", 6:"Saturday"}
+    months_num_to_name = {1: "January", 2: "February", 3: "March", 4: "April", 5: "May", 6: "June"	, 7: "July"	, 8: "August", 9: "September", 10: "October", 11: "November", 12: "December"}
+    if args["stats"]:
+        names = {"weekday": days_num_to_name, "month": months_num_to_name}.get(args["stats"])
+        for group, answers, mean, fastest, slowest, right in latency_stats(args["database"], args["stats"]):
+            name = names[group] if names else f"{group*100}s"
+            print(f"{name:>10}: {answers} answers, {mean:.1f} s on average ({fastest:.1f} to {slowest:.1f} s), {right:.0%} right")
+        exit()
+    if args["drill"]:
+        dates = random_dates(args["drill"])
+        for date, weekday, doomsday in zip(dates, weekdays(dates), doomsdays(dates)):
+            print(f"{date}: {days_num_to_name[weekday]} (doomsday {days_num_to_name[doomsday]})")
+        exit()
+    print("To exit the program, write stop or exit")
     days_name_to_num = {"Sunday":0, "Monday":1, "Tuesday":2, "Wednesday":3, "Thursday":4, "Friday":5, "Saturday":6}
-    year, month, day, date_obj = create_date()
-    get_answer(year, month, day, date_obj)
\ No newline at end of file
+    log = ResultLog(args["database"])
+    try:
+        quiz(log)
+    finally:
+        # The answers still in memory are saved even after ctrl+c
+        log.close()
\ No newline at end of file
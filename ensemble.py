@@ -0,0 +1,142 @@
+"""
+Ensembles of headless many body simulations for parameter sweeps. Every combination of dimension, number of bodies
+and mass is run several times with different seeds, spread over a pool of processes (one per core by default).
+The seeds are spawned from a single root seed with np.random.SeedSequence, so the whole ensemble is reproducible and
+the runs are independent whatever the order they finish in. Each run reports the final kinetic energy, the number of
+collisions, the bodies that escaped the box despite the wall bounce and its wall clock time, and all the results go
+to one CSV table.
+Example:
+    python ensemble.py -nb 25 100 400 -d 2 3 -m 10:500 250 -r 20 -st 2000 -o ensemble.csv
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+
+from many_body_core import SOLVERS, BodySystem, Simulation
+from integrators import INTEGRATORS, kinetic_energy
+
+# Columns of the results table
+FIELDS = (
+    "run", "dimension", "number_bodies", "mass", "steps", "seed_entropy", "spawn_key", "final_kinetic_energy",
+    "collisions", "escaped", "seconds"
+)
+
+
+class CollisionCounter:
+    """A consumer of a Simulation that counts the colliding pairs of every step"""
+    def __init__(self):
+        self.collisions = 0
+
+    def __call__(self, system):
+        self.collisions += system.colliding_pairs[0].size
+
+
+def run_job(job):
+    """Runs one simulation of the ensemble, this is what every worker process executes"""
+    rng = np.random.default_rng(job["seed"])
+    box = (job["box"],) * job["dimension"]
+    system = BodySystem.random(job["number_bodies"], box, rng, job["mass"], **job["options"])
+    counter = CollisionCounter()
+    simulation = Simulation(system)
+    simulation.attach(counter)
+
+    start = perf_counter()
+    simulation.run(job["steps"])
+    seconds = perf_counter() - start
+
+    outside = ((system.positions < 0) | (system.positions > system.box)).any(axis=1)
+    return {
+        "run": job["run"],
+        "dimension": job["dimension"],
+        "number_bodies": job["number_bodies"],
+        "mass": job["mass_label"],
+        "steps": job["steps"],
+        "seed_entropy": job["seed"].entropy,
+        "spawn_key": ":".join(map(str, job["seed"].spawn_key)),
+        "final_kinetic_energy": kinetic_energy(system),
+        "collisions": counter.collisions,
+        "escaped": int(outside.sum()),
+        "seconds": seconds,
+    }
+
+
+def parse_mass(text):
+    """A mass is either a number or a range low:high"""
+    if ":" in text:
+        low, high = text.split(":")
+        return (int(low), int(high))
+    return float(text)
+
+
+def make_jobs(number_bodies, dimensions, masses, runs, steps, box=700, seed=None, **options):
+    """One job per combination and repetition, each with its own seed spawned from the root one"""
+    combinations = list(product(dimensions, number_bodies, masses))
+    seeds = np.random.SeedSequence(seed).spawn(len(combinations) * runs)
+    jobs = list()
+    for dimension, bodies, mass in combinations:
+        for _ in range(runs):
+            jobs.append({
+                "run": len(jobs),
+                "dimension": dimension,
+                "number_bodies": bodies,
+                "mass": parse_mass(mass),
+                "mass_label": mass,
+                "steps": steps,
+                "box": box,
+                "seed": seeds[len(jobs)],
+                "options": options,
+            })
+    return jobs
+
+
+def run_ensemble(jobs, output, workers=None):
+    """
+    Runs the jobs in a process pool, in the order they finish, and writes the results sorted by run to the CSV file
+    output. Returns the results
+    """
+    results = list()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            results.append(future.result())
+            print(f"{done}/{len(jobs)} runs finished")
+    results.sort(key=lambda result: result["run"])
+    with open(output, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Runs many headless simulations in parallel and collects their statistics")
+
+    # Add arguments to the parser
+    all_args.add_argument("-nb", "--number_bodies", type=int, nargs="+", default=[25], help="Numbers of bodies to sweep")
+    all_args.add_argument("-d", "--dimension", type=int, nargs="+", choices=(2, 3), default=[2], help="Dimensions to sweep")
+    all_args.add_argument("-m", "--mass", nargs="+", default=["10:500"], help="Masses to sweep, a number or a range low:high")
+    all_args.add_argument("-r", "--runs", type=int, default=10, help="Runs of every combination, each with its own seed")
+    all_args.add_argument("-st", "--steps", type=int, default=1000, help="Steps of every run")
+    all_args.add_argument("-b", "--box", type=int, default=700, help="Size of the box in every dimension")
+    all_args.add_argument("-se", "--seed", type=int, default=None, help="Root seed the seeds of all the runs are spawned from")
+    all_args.add_argument("-w", "--workers", type=int, default=None, help="Processes of the pool, one per core by default")
+    all_args.add_argument("-so", "--solver", choices=SOLVERS, default="direct", help="Force engine: direct sum or Barnes-Hut tree")
+    all_args.add_argument("-in", "--integrator", choices=tuple(INTEGRATORS), default="semi_implicit", help="Time integrator")
+    all_args.add_argument("-dt", "--dt", type=float, default=1.0, help="Timestep of the integrator")
+    all_args.add_argument("-o", "--output", default="ensemble.csv", help="CSV file with one row per run")
+    args = vars(all_args.parse_args())
+
+    jobs = make_jobs(
+        args["number_bodies"], args["dimension"], args["mass"], args["runs"], args["steps"], args["box"], args["seed"],
+        solver=args["solver"], integrator=args["integrator"], dt=args["dt"]
+    )
+    start = perf_counter()
+    run_ensemble(jobs, args["output"], args["workers"])
+    print(f"{len(jobs)} runs in {perf_counter() - start:.1f} s, results in {args['output']}")
@@ -0,0 +1,144 @@
+"""
+Time integrators for the many body simulations. Each integrator advances a BodySystem (see many_body_core.py) a time
+dt using system.accelerations(), which includes gravity and collisions, and then bounces the bodies on the walls.
+  - euler: forward Euler, the position moves with the old velocity
+  - semi_implicit: semi-implicit (symplectic) Euler, the velocity is updated first and the position moves with the new
+    one. With dt = 1 this is exactly the update the simulations have always used
+  - verlet: leapfrog in its velocity Verlet form (kick, drift, kick)
+  - rk4: classic fourth order Runge-Kutta
+Close encounters can be handled with adaptive substepping, and DriftMonitor reports the energy and momentum drift
+of any integrator. The collisions and the walls are not conservative, so they also show up in the drift.
+"""
+import numpy as np
+
+from many_body_core import GRAVITATIONAL_CONSTANT, PAIR_BLOCK_SIZE, bounce_on_walls
+from cell_list import close_pairs
+
+# Fraction of the shortest timescale of the close encounters that a substep can last
+SUBSTEP_SAFETY = 0.1
+# Extra distance to the sum of the radii under which two bodies are a close encounter
+ENCOUNTER_MARGIN = 20
+# Substeps are never divided further than this
+MAX_SUBSTEPS = 64
+
+
+def euler(system, dt):
+    accelerations = system.accelerations()
+    system.positions += system.velocities * dt
+    system.velocities += accelerations * dt
+    bounce_on_walls(system.positions, system.velocities, system.box)
+
+
+def semi_implicit(system, dt):
+    system.velocities += system.accelerations() * dt
+    bounce_on_walls(system.positions, system.velocities, system.box)
+    system.positions += system.velocities * dt
+
+
+def verlet(system, dt):
+    # The acceleration at the end of a step is the one at the start of the next, it is only recomputed when the
+    # positions changed in between (computing it again gives exactly the same numbers)
+    accelerations = system.cached_accelerations
+    if accelerations is None:
+        accelerations = system.accelerations()
+    system.velocities += accelerations * (dt/2)
+    system.positions += system.velocities * dt
+    accelerations = system.accelerations()
+    system.velocities += accelerations * (dt/2)
+    if bounce_on_walls(system.positions, system.velocities, system.box):
+        accelerations = None
+    system.cached_accelerations = accelerations
+
+
+def rk4(system, dt):
+    positions, velocities = system.positions.copy(), system.velocities.copy()
+    # Slopes of the position (velocities) and of the velocity (accelerations) at the four stages
+    k1_x, k1_v = velocities, system.accelerations()
+    system.positions[:] = positions + k1_x * (dt/2)
+    k2_x, k2_v = velocities + k1_v * (dt/2), system.accelerations()
+    system.positions[:] = positions + k2_x * (dt/2)
+    k3_x, k3_v = velocities + k2_v * (dt/2), system.accelerations()
+    system.positions[:] = positions + k3_x * dt
+    k4_x, k4_v = velocities + k3_v * dt, system.accelerations()
+    system.positions[:] = positions + (k1_x + 2*k2_x + 2*k3_x + k4_x) * (dt/6)
+    system.velocities[:] = velocities + (k1_v + 2*k2_v + 2*k3_v + k4_v) * (dt/6)
+    bounce_on_walls(system.positions, system.velocities, system.box)
+
+
+INTEGRATORS = {"euler": euler, "semi_implicit": semi_implicit, "verlet": verlet, "rk4": rk4}
+
+
+def adaptive_substeps(system, dt, G=GRAVITATIONAL_CONSTANT):
+    """
+    Number of substeps needed so a step of length dt does not blow up the close encounters. For every pair closer than
+    the sum of their radii plus ENCOUNTER_MARGIN the timescale is the shortest of the free fall time, sqrt(d^3/(G*M)),
+    and the time to cover the separation at the relative velocity, d/v. The substeps last at most SUBSTEP_SAFETY times
+    the shortest timescale.
+    """
+    pairs_i, pairs_j = close_pairs(system.positions, system.radii, ENCOUNTER_MARGIN)
+    if pairs_i.size == 0:
+        return 1
+    separation = np.linalg.norm(system.positions[pairs_j] - system.positions[pairs_i], axis=1)
+    relative_speed = np.linalg.norm(system.velocities[pairs_j] - system.velocities[pairs_i], axis=1)
+    free_fall = np.sqrt(separation**3 / (G * (system.masses[pairs_i] + system.masses[pairs_j])))
+    crossing = separation / np.maximum(relative_speed, 1e-12)
+    timescale = np.minimum(free_fall, crossing).min()
+    if timescale <= 0:
+        return MAX_SUBSTEPS
+    return int(min(max(np.ceil(dt / (SUBSTEP_SAFETY * timescale)), 1), MAX_SUBSTEPS))
+
+
+def kinetic_energy(system):
+    return 0.5 * np.sum(system.masses * np.einsum("ij,ij->i", system.velocities, system.velocities))
+
+
+def potential_energy(system, G=GRAVITATIONAL_CONSTANT):
+    """Gravitational potential energy of every pair, -G*m_i*m_j/d, computed in blocks like direct_accelerations"""
+    positions, masses = system.positions, system.masses
+    number_bodies, dimension = positions.shape
+    block = max(1, PAIR_BLOCK_SIZE // max(1, number_bodies * dimension))
+    energy = 0.0
+    for start in range(0, number_bodies, block):
+        stop = min(start + block, number_bodies)
+        difference = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        distance = np.sqrt(np.einsum("ijk,ijk->ij", difference, difference))
+        inverse = np.zeros_like(distance)
+        np.divide(1, distance, out=inverse, where=distance > 0)
+        energy -= G * np.sum(masses[start:stop, np.newaxis] * masses[np.newaxis, :] * inverse)
+    # Every pair was counted twice
+    return energy / 2
+
+
+def total_energy(system):
+    return kinetic_energy(system) + potential_energy(system)
+
+
+def momentum(system):
+    return np.sum(system.masses[:, np.newaxis] * system.velocities, axis=0)
+
+
+class DriftMonitor:
+    """
+    A consumer of a Simulation that records, after every step, the relative drift of the total energy and the drift of
+    the total momentum with respect to the start of the run. The potential energy is a sum over every pair, so this
+    costs as much as a direct sum step.
+    """
+    def __init__(self, system):
+        self.initial_energy = total_energy(system)
+        self.initial_momentum = momentum(system)
+        self.energy_drift = list()
+        self.momentum_drift = list()
+
+    def __call__(self, system):
+        energy = total_energy(system)
+        self.energy_drift.append(abs(energy - self.initial_energy) / max(abs(self.initial_energy), 1e-300))
+        self.momentum_drift.append(np.linalg.norm(momentum(system) - self.initial_momentum))
+
+    def report(self):
+        """Final and maximum drifts, as a string"""
+        if not self.energy_drift:
+            return "No steps recorded"
+        return (
+            f"Energy drift: final {self.energy_drift[-1]:.3e}, max {max(self.energy_drift):.3e}. "
+            f"Momentum drift: final {self.momentum_drift[-1]:.3e}, max {max(self.momentum_drift):.3e}"
+        )
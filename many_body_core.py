@@ -0,0 +1,377 @@
+"""
+Shared simulation core for Many-body.py and many-body3D.py. Instead of one object per body and a nested Python loop
+over every pair, the state of all the bodies lives in contiguous arrays: masses (N,), radii (N,), positions (N, D) and
+velocities (N, D), where D is 2 or 3, all slices of one preallocated buffer of float64 or float32. A single body can
+still be handled as an object through BodyView, a view of its row that has no state of its own. Every frame computes
+all the pairwise accelerations, the collision damping and the wall bounce with broadcasting, so the interpreter only
+runs a handful of operations per step whatever the number of bodies.
+The collisions are a separate stage: the colliding pairs are found with a cell list (see cell_list.py) and only those
+pairs have their gravitational pull reversed.
+"""
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+import numpy as np
+
+from cell_list import close_pairs
+
+# Gravitational constant G in N·m^2·kg^(-2)
+GRAVITATIONAL_CONSTANT = 0.01
+# Extra distance added to the sum of the radii under which two bodies are considered to be colliding
+COLLISION_MARGIN = 5
+# Factor applied to the gravitational pull of a colliding pair, they repel in an imperfect inelastic colision fashion
+COLLISION_DAMPING = -0.5
+# Distance from the walls at which the bodies bounce, and the factor applied to the velocity when they do
+WALL_MARGIN = 5
+WALL_DAMPING = -0.9
+# Maximum number of pairwise elements computed at once, this keeps the temporary arrays small for thousands of bodies
+PAIR_BLOCK_SIZE = 2**20
+# Force engines a BodySystem can use
+SOLVERS = ("direct", "bh")
+# Precisions the state of a BodySystem can be stored in. float32 halves the memory of large systems
+DTYPES = (np.dtype(np.float64), np.dtype(np.float32))
+
+
+def radius_from_mass(masses):
+    """
+    It is implied that the density of the bodies is 1, thus their radius can be defined with the inverse of the
+    volume formula of a sphere (the same formula that Body and Body3D use)
+    """
+    return (np.asarray(masses, dtype=float) / np.pi)**(1/3)
+
+
+def accumulate_rows(accelerations, bodies, values):
+    """Adds each row of values to the acceleration of its body, np.add.at is much slower than bincount"""
+    for k in range(accelerations.shape[1]):
+        accelerations[:, k] += np.bincount(bodies, weights=values[:, k], minlength=accelerations.shape[0])
+
+
+def direct_accelerations(positions, masses, G=GRAVITATIONAL_CONSTANT):
+    """
+    Computes the gravitational acceleration every body suffers because of all the others by direct summation over
+    every pair. Coincident bodies (distance zero) do not interact, this avoids a division by zero.
+    The rows are processed in blocks so the (block, N, D) temporaries never grow past PAIR_BLOCK_SIZE elements.
+    """
+    number_bodies, dimension = positions.shape
+    accelerations = np.zeros_like(positions)
+    block = max(1, PAIR_BLOCK_SIZE // max(1, number_bodies * dimension))
+
+    for start in range(0, number_bodies, block):
+        stop = min(start + block, number_bodies)
+        # Vectors from each body of the block to every other body, (block, N, D)
+        difference = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        distance = np.sqrt(np.einsum("ijk,ijk->ij", difference, difference))
+        # G*m_j/d^3 for every pair, zero for the body with itself
+        factor = np.zeros_like(distance)
+        np.divide(G * masses[np.newaxis, :], distance**3, out=factor, where=distance > 0)
+        accelerations[start:stop] = np.einsum("ij,ijk->ik", factor, difference)
+    return accelerations
+
+
+def damp_collisions(accelerations, positions, masses, pairs_i, pairs_j, G=GRAVITATIONAL_CONSTANT):
+    """
+    The colliding pairs repel in an imperfect inelastic colision fashion, as in Body.check_colision: the gravitational
+    pull between the two bodies, already included in the accelerations, is multiplied by COLLISION_DAMPING
+    """
+    difference = positions[pairs_j] - positions[pairs_i]
+    distance = np.sqrt(np.einsum("ij,ij->i", difference, difference))
+    factor = np.zeros_like(distance)
+    np.divide((COLLISION_DAMPING - 1) * G, distance**3, out=factor, where=distance > 0)
+    pull = factor[:, np.newaxis] * difference
+    # i is pulled towards j and j towards i
+    accumulate_rows(accelerations, pairs_i, pull * masses[pairs_j, np.newaxis])
+    accumulate_rows(accelerations, pairs_j, -pull * masses[pairs_i, np.newaxis])
+
+
+def bounce_on_walls(positions, velocities, box):
+    """
+    Implements solid borders that the bodies will bounce off of, in every dimension at once. The bounce is like an
+    inelastic colision: the velocity is reversed and damped and the body is pushed one unit back inside the box.
+    Returns True if any body bounced
+    """
+    below = positions < WALL_MARGIN
+    above = positions > box - WALL_MARGIN
+    bounced = below | above
+    velocities[bounced] *= WALL_DAMPING
+    positions += below
+    positions -= above
+    return bool(bounced.any())
+
+
+class StageTimer:
+    """
+    Accumulates the seconds spent in each stage of the steps (forces, collisions, integration, projection, render).
+    Used as timer("forces") in a with statement. The integration is the time of the whole step minus the forces and
+    the collisions
+    """
+    def __init__(self):
+        self.seconds = dict()
+        self.steps = 0
+
+    @contextmanager
+    def __call__(self, stage):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + perf_counter() - start
+
+    def per_step(self):
+        """Milliseconds per step of every stage"""
+        stages = dict(self.seconds)
+        if "step" in stages:
+            stages["integration"] = stages.pop("step") - stages.get("forces", 0) - stages.get("collisions", 0)
+        return {stage: 1000 * seconds / max(self.steps, 1) for stage, seconds in stages.items()}
+
+    def report(self):
+        return ", ".join(f"{stage} {milliseconds:.3f} ms" for stage, milliseconds in self.per_step().items())
+
+    def reset(self):
+        self.seconds = dict()
+        self.steps = 0
+
+
+class BodyView:
+    """
+    One body of a BodySystem. It holds no state of its own, only the system and the index of the body, so reading or
+    changing its mass, position or velocity reads or changes the arrays of the system. position and velocity are
+    views of the rows of the arrays, body.velocity += dv updates the system in place.
+    """
+    __slots__ = ("system", "index")
+
+    def __init__(self, system, index):
+        self.system = system
+        self.index = index
+
+    @classmethod
+    def of(cls, system, index):
+        """A view of the body index of system, without calling the __init__ of the subclasses"""
+        view = cls.__new__(cls)
+        BodyView.__init__(view, system, index)
+        return view
+
+    @property
+    def mass(self):
+        return self.system.masses[self.index]
+
+    @mass.setter
+    def mass(self, value):
+        self.system.masses[self.index] = value
+        self.system.radii[self.index] = radius_from_mass(value)
+
+    @property
+    def radius(self):
+        return self.system.radii[self.index]
+
+    @property
+    def position(self):
+        return self.system.positions[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.system.positions[self.index] = value
+
+    @property
+    def velocity(self):
+        return self.system.velocities[self.index]
+
+    @velocity.setter
+    def velocity(self, value):
+        self.system.velocities[self.index] = value
+
+    def __eq__(self, other):
+        # Two views are the same body if they look at the same row of the same system
+        return isinstance(other, BodyView) and self.system is other.system and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.system), self.index))
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(mass={self.mass:g}, position={self.position.tolist()}, "
+            f"velocity={self.velocity.tolist()})"
+        )
+
+
+class BodySystem:
+    """
+    All the bodies of a simulation stored as a structure of arrays. The box the bodies live in has one size per
+    dimension, (width, height) for the 2D simulation and (x, y, z) for the 3D one.
+    The solver is "direct" for the direct sum over every pair or "bh" for the Barnes-Hut tree (see barnes_hut.py),
+    theta is the opening angle of the tree.
+    Every step advances the time dt with the integrator (see integrators.py), divided in substeps during close
+    encounters if adaptive is True.
+    The state is stored in float64 or, to save memory with many bodies, float32 (dtype). The bodies can still be seen
+    one at a time with body() and bodies(), which return BodyView objects.
+    """
+    def __init__(
+        self, masses, positions, velocities, box, solver="direct", theta=0.5, integrator="semi_implicit", dt=1.0,
+        adaptive=False, dtype=np.float64
+    ):
+        # Imported here because the integrators use the constants and functions of this module
+        from integrators import INTEGRATORS
+
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver}, use one of {SOLVERS}")
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Unknown integrator {integrator}, use one of {tuple(INTEGRATORS)}")
+        if np.dtype(dtype) not in DTYPES:
+            raise ValueError(f"Unknown dtype {dtype}, use one of {tuple(np.dtype(d).name for d in DTYPES)}")
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim != 2:
+            positions = positions.reshape(-1, np.size(box))
+        number_bodies, dimension = positions.shape
+        # One buffer for everything, each field is a contiguous slice of it: masses, radii, positions and velocities.
+        # The arrays below are views, they are always updated in place and never replaced
+        self.store = np.empty(number_bodies * (2 + 2*dimension), dtype=dtype)
+        fields = np.split(self.store, np.cumsum([number_bodies, number_bodies, number_bodies * dimension]))
+        self.masses, self.radii = fields[0], fields[1]
+        self.positions = fields[2].reshape(number_bodies, dimension)
+        self.velocities = fields[3].reshape(number_bodies, dimension)
+        self.masses[:] = masses
+        self.radii[:] = radius_from_mass(self.masses)
+        self.positions[:] = positions
+        self.velocities[:] = velocities
+        self.box = np.array(box, dtype=float)
+        self.solver = solver
+        self.theta = theta
+        self.integrator = integrator
+        self.dt = dt
+        self.adaptive = adaptive
+        # Acceleration at the current positions, kept by the integrators that can reuse it. None if unknown
+        self.cached_accelerations = None
+        # Substeps used in the last step
+        self.substeps = 1
+        # StageTimer that measures the stages of every step, None to not measure them
+        self.timer = None
+        # Pairs (i, j) that collided in the last step
+        self.colliding_pairs = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        # Number of steps and time of the simulation
+        self.T = 0
+        self.time = 0.0
+
+    @classmethod
+    def from_bodies(cls, bodies, box, **kwargs):
+        """Builds the arrays from a list of bodies, anything with a mass, a position and a velocity"""
+        return cls(
+            [body.mass for body in bodies],
+            [body.position for body in bodies],
+            [body.velocity for body in bodies],
+            box,
+            **kwargs
+        )
+
+    @classmethod
+    def random(cls, number_bodies, box, rng, mass=(10, 500), **kwargs):
+        """
+        Random bodies like the ones of the simulations: integer positions between 50 and the size of the box and small
+        random velocities. mass is either a fixed mass or a (low, high) range of integer masses
+        """
+        box = np.asarray(box)
+        if np.ndim(mass) == 0:
+            masses = np.full(number_bodies, float(mass))
+        else:
+            masses = rng.integers(mass[0], mass[1], size=number_bodies)
+        positions = rng.integers(50, box, size=(number_bodies, box.size))
+        velocities = rng.integers(-10, 10, size=(number_bodies, box.size))/20
+        return cls(masses, positions, velocities, box, **kwargs)
+
+    @property
+    def number_bodies(self):
+        return self.positions.shape[0]
+
+    @property
+    def dtype(self):
+        return self.store.dtype
+
+    def body(self, index, view=None):
+        """A view of one body, BodyView by default or a subclass of it like Body or Body3D"""
+        return (view or BodyView).of(self, index)
+
+    def bodies(self, view=None):
+        """Views of all the bodies"""
+        return [self.body(index, view) for index in range(self.number_bodies)]
+
+    @property
+    def dimension(self):
+        return self.positions.shape[1]
+
+    def stage(self, name):
+        """Measures a stage with the timer, if there is one"""
+        return self.timer(name) if self.timer is not None else nullcontext()
+
+    def accelerations(self):
+        """
+        Acceleration of every body: the gravity with the chosen solver and then the collisions, only the pairs in
+        neighbouring cells are tested
+        """
+        with self.stage("forces"):
+            if self.solver == "bh":
+                # Imported here because barnes_hut uses the constants and the direct sum of this module
+                from barnes_hut import tree_accelerations
+                accelerations = tree_accelerations(self.positions, self.masses, self.theta)
+            else:
+                accelerations = direct_accelerations(self.positions, self.masses)
+        with self.stage("collisions"):
+            self.colliding_pairs = close_pairs(self.positions, self.radii, COLLISION_MARGIN)
+            damp_collisions(accelerations, self.positions, self.masses, *self.colliding_pairs)
+        return accelerations
+
+    def step(self):
+        """
+        Advances the simulation one step of length dt. With the default semi-implicit Euler and dt = 1 the velocity
+        is updated with the acceleration and then the position with the velocity, as the simulations always did
+        """
+        from integrators import INTEGRATORS, adaptive_substeps
+
+        self.T += 1
+        with self.stage("step"):
+            self.substeps = adaptive_substeps(self, self.dt) if self.adaptive else 1
+            for _ in range(self.substeps):
+                INTEGRATORS[self.integrator](self, self.dt / self.substeps)
+        if self.timer is not None:
+            self.timer.steps += 1
+        self.time += self.dt
+
+
+class Simulation:
+    """
+    Runs the physics of a BodySystem. The consumers, like a Tk window that draws the bodies, are callables that receive
+    the system after every step. They can be attached and detached at any time, without consumers the physics run
+    headless. A consumer that returns False stops the run.
+    """
+    def __init__(self, system):
+        self.system = system
+        self.consumers = list()
+
+    def attach(self, consumer):
+        self.consumers.append(consumer)
+
+    def detach(self, consumer):
+        self.consumers.remove(consumer)
+
+    def run(self, steps):
+        """Advances the system the given number of steps. Returns the steps done and the seconds it took"""
+        start = perf_counter()
+        for steps_done in range(1, steps + 1):
+            self.system.step()
+            # Copy the list, a consumer may detach itself
+            for consumer in list(self.consumers):
+                if consumer(self.system) is False:
+                    return steps_done, perf_counter() - start
+        return steps, perf_counter() - start
+
+
+class Profiler:
+    """
+    A consumer of a Simulation that measures the stages of every step and prints the milliseconds per step of each
+    one every given number of steps
+    """
+    def __init__(self, system, every=100):
+        self.every = max(1, every)
+        system.timer = StageTimer()
+
+    def __call__(self, system):
+        if system.T % self.every == 0:
+            print(f"T = {system.T}: {system.timer.report()}")
+            system.timer.reset()
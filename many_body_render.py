@@ -0,0 +1,109 @@
+"""
+Retained mode Tkinter renderer for the many body simulations. Instead of deleting everything and creating one oval per
+body every frame, the ovals are created once and then moved with canvas.coords. Frames can be skipped, drawing only every
+k-th physics step or at most a target number of frames per second, so the physics are not bound to the speed of Tk.
+"""
+from contextlib import nullcontext
+from time import perf_counter
+
+import numpy as np
+
+
+def circle_boxes(system):
+    """Bounding boxes (x0, y0, x1, y1) of the bodies of a two dimensional system, one row per body"""
+    radii = system.radii[:, np.newaxis]
+    return np.concatenate((system.positions - radii, system.positions + radii), axis=1)
+
+
+def rotation_y(beta):
+    """Rotation matrix around the y axis"""
+    return np.array([
+        [np.cos(beta), 0, -np.sin(beta)],
+        [0, 1, 0],
+        [np.sin(beta), 0, np.cos(beta)]
+    ])
+
+
+class PerspectiveProjection:
+    """
+    Projects the spheres of a three dimensional system into the plane z = plane_z, as seen from the point of "light"
+    point_view, for all the bodies at once. The camera can orbit around the y axis through center, orbit_speed radians
+    per step: instead of rotating the point of view and the plane, the positions are rotated the other way, a single
+    matrix multiplication per frame.
+    Calling it with a system returns the (N, 4) bounding boxes sorted from the farthest body to the nearest one. All the
+    ovals look the same, so giving the boxes to the items in this order draws the nearer bodies on top.
+    """
+    def __init__(self, point_view, plane_z, center, orbit_speed=0.0):
+        self.point_view = np.asarray(point_view, dtype=float)
+        self.plane_z = plane_z
+        self.center = np.asarray(center, dtype=float)
+        self.orbit_speed = orbit_speed
+
+    def __call__(self, system):
+        positions = system.positions
+        if self.orbit_speed:
+            rotation = rotation_y(-self.orbit_speed * system.T)
+            positions = (positions - self.center) @ rotation.T + self.center
+        # Vectors from the view point to the center of every body
+        from_point_view = positions - self.point_view
+        # Parameter of the line through the center of the body that reaches the plane
+        parameter = (self.plane_z - positions[:, 2]) / from_point_view[:, 2]
+        # The two lines that define the oval are displaced sqrt(2)*radius in x and y
+        offset = np.sqrt(2) * system.radii[:, np.newaxis]
+        center = from_point_view[:, :2] * parameter[:, np.newaxis] + positions[:, :2]
+        half_size = offset * parameter[:, np.newaxis]
+        boxes = np.concatenate((center + half_size, center - half_size), axis=1)
+        # Farthest first, the nearest bodies are the ones with the biggest z
+        return boxes[np.argsort(positions[:, 2], kind="stable")]
+
+
+class TkRenderer:
+    """
+    A consumer of a Simulation (see many_body_core.py) that draws the bodies on a Tkinter canvas.
+    bounding_boxes is a function that takes the system and returns the (N, 4) boxes of the ovals.
+    Only one every render_every steps is drawn, and if max_fps is given frames that come too soon are skipped.
+    The overlay shows the frames per second and the physics steps per second. If the system has a timer (see
+    StageTimer in many_body_core.py) the projection and the drawing are measured as stages.
+    """
+    def __init__(self, canvas, system, bounding_boxes=circle_boxes, render_every=1, max_fps=None, overlay=True, fill="yellow"):
+        # Imported here so the projections can be used without Tk
+        import tkinter as tk
+
+        self.TclError = tk.TclError
+        self.canvas = canvas
+        self.bounding_boxes = bounding_boxes
+        self.render_every = max(1, render_every)
+        self.min_frame_time = 1 / max_fps if max_fps else 0
+        # One oval per body, created only once
+        self.items = [canvas.create_oval(*box, fill=fill) for box in bounding_boxes(system).tolist()]
+        self.overlay = canvas.create_text(10, 10, anchor="nw", fill="white", text="") if overlay else None
+        # Counters for the overlay, they are reset every second
+        self.last_frame = 0
+        self.last_overlay = perf_counter()
+        self.frames = 0
+        self.steps = 0
+
+    def __call__(self, system):
+        self.steps += 1
+        now = perf_counter()
+        if system.T % self.render_every != 0 or now - self.last_frame < self.min_frame_time:
+            return
+        self.last_frame = now
+        self.frames += 1
+        timer = getattr(system, "timer", None)
+        try:
+            with timer("projection") if timer is not None else nullcontext():
+                boxes = self.bounding_boxes(system).tolist()
+            with timer("render") if timer is not None else nullcontext():
+                for item, box in zip(self.items, boxes):
+                    self.canvas.coords(item, *box)
+                if self.overlay is not None and now - self.last_overlay >= 1:
+                    elapsed = now - self.last_overlay
+                    self.canvas.itemconfigure(
+                        self.overlay, text=f"{self.frames/elapsed:.1f} FPS, {self.steps/elapsed:.1f} steps/s, T = {system.T}"
+                    )
+                    self.last_overlay, self.frames, self.steps = now, 0, 0
+                self.canvas.update()
+        except self.TclError:
+            # The window was closed, stop the simulation
+            return False
@@ -0,0 +1,117 @@
+"""
+Running of the many body simulations, shared by Many-body.py and many-body3D.py. A run either starts from new bodies
+or resumes a checkpoint, then the consumers of the script (the window, the drift monitor) and the ones asked for on the
+command line (the trajectory writer, the checkpointer, the profiler) are attached to a Simulation, it runs until the
+system reaches the total number of steps and the outputs are closed. The scripts only give how to create their bodies
+and, for the window, how to draw them; add_arguments gives both of them the same command line.
+Example:
+    python Many-body.py -hl -nb 400 -st 2000 -se 0 -rec run -cp run.npz
+"""
+import numpy as np
+
+from many_body_core import DTYPES, SOLVERS, Profiler, Simulation
+from integrators import INTEGRATORS, DriftMonitor
+from trajectory import TrajectoryWriter
+from checkpoint import Checkpointer, load_checkpoint, save_checkpoint
+
+# Arguments of the command line that go to the BodySystem and the ones that go to run
+SYSTEM_OPTIONS = ("solver", "theta", "integrator", "dt", "adaptive", "dtype")
+RUN_OPTIONS = ("record", "record_stride", "resume", "checkpoint", "checkpoint_every", "profile")
+
+
+def load_or_create(create_system, number_bodies, box, seed=None, resume=None, verbose=False, **options):
+    """
+    The system and the random generator of the run: the ones saved in the checkpoint resume, or number_bodies new
+    bodies in the box from create_system(number_bodies, box, rng, verbose, **options) and a generator of seed
+    """
+    if resume:
+        system, rng = load_checkpoint(resume)
+        print(f"Resumed {resume} at T = {system.T}")
+    else:
+        rng = np.random.default_rng(seed)
+        system = create_system(number_bodies, box, rng, verbose=verbose, **options)
+    return system, rng
+
+
+def run(
+    system, rng, steps, consumers=(), record=None, record_stride=1, checkpoint=None, checkpoint_every=1000,
+    profile=None, final_checkpoint=False
+):
+    """
+    Runs the system until it reaches T = steps, so a resumed run only does the steps left, with the consumers attached
+    first. If record is a name, one every record_stride steps is recorded to disk (see trajectory.py). If checkpoint is
+    a path the state is saved there every checkpoint_every steps, and at the end with final_checkpoint. If profile is a
+    number of steps, the time of every stage is printed that often. Returns the steps done and the seconds it took
+    """
+    steps = max(steps - system.T, 0)
+    simulation = Simulation(system)
+    for consumer in consumers:
+        simulation.attach(consumer)
+    if record:
+        writer = TrajectoryWriter(record, system, steps, record_stride)
+        simulation.attach(writer)
+    if checkpoint:
+        simulation.attach(Checkpointer(checkpoint, checkpoint_every, rng))
+    if profile:
+        simulation.attach(Profiler(system, profile))
+    steps_done, seconds = simulation.run(steps)
+    if record:
+        writer.close()
+    if checkpoint and final_checkpoint:
+        save_checkpoint(checkpoint, system, rng)
+    return steps_done, seconds
+
+
+def headless(
+    create_system, box, number_bodies=25, steps=1000, seed=None, drift=False, resume=None, record=None,
+    record_stride=1, checkpoint=None, checkpoint_every=1000, profile=None, **options
+):
+    """
+    Runs only the physics, without any window, and reports the number of steps per second. If drift is True it also
+    reports the energy and momentum drift of the integrator. steps is the total number of steps: a run resumed from a
+    checkpoint only does the ones left, and the checkpoint is also saved at the end. The rest of the arguments are the
+    ones of load_or_create and run
+    """
+    system, rng = load_or_create(create_system, number_bodies, box, seed, resume, **options)
+    consumers = list()
+    if drift:
+        monitor = DriftMonitor(system)
+        consumers.append(monitor)
+    steps_done, seconds = run(
+        system, rng, steps, consumers, record, record_stride, checkpoint, checkpoint_every, profile,
+        final_checkpoint=True
+    )
+    print(f"{system.number_bodies} bodies, {steps_done} steps in {seconds:.2f} s: {steps_done/seconds:.1f} steps/s")
+    if drift:
+        print(monitor.report())
+
+
+def add_arguments(all_args):
+    """Adds the arguments that both scripts have to an argparse parser"""
+    all_args.add_argument("-wi", "--width", type=int, default=700, help="The width of the window")
+    all_args.add_argument("-he", "--height", type=int, default=700, help="The heigth of the window")
+    all_args.add_argument("-nb", "--number_bodies", type=int, default=25, help="The number of bodies. Lower numbers of bodies might make the simulation run too fast")
+    all_args.add_argument("-so", "--solver", choices=SOLVERS, default="direct", help="Force engine: direct sum or Barnes-Hut tree")
+    all_args.add_argument("-th", "--theta", type=float, default=0.5, help="Opening angle of the Barnes-Hut tree")
+    all_args.add_argument("-in", "--integrator", choices=tuple(INTEGRATORS), default="semi_implicit", help="Time integrator")
+    all_args.add_argument("-dt", "--dt", type=float, default=1.0, help="Timestep of the integrator")
+    all_args.add_argument("-ad", "--adaptive", action="store_true", help="Divide the steps in substeps during close encounters")
+    all_args.add_argument("-dty", "--dtype", choices=tuple(dtype.name for dtype in DTYPES), default="float64", help="Precision of the state, float32 halves its memory")
+    all_args.add_argument("-re", "--render_every", type=int, default=1, help="Draw only one every this many steps")
+    all_args.add_argument("-fps", "--max_fps", type=float, default=None, help="Maximum frames drawn per second")
+    all_args.add_argument("-rec", "--record", default=None, help="Record the run to <record>_positions.npy and so on, replay it with trajectory.py")
+    all_args.add_argument("-rs", "--record_stride", type=int, default=1, help="Record only one every this many steps")
+    all_args.add_argument("-cp", "--checkpoint", default=None, help="Save the state of the run to this file every checkpoint_every steps")
+    all_args.add_argument("-ce", "--checkpoint_every", type=int, default=1000, help="Steps between checkpoints")
+    all_args.add_argument("-rsm", "--resume", default=None, help="Continue the run saved in this checkpoint")
+    all_args.add_argument("-pr", "--profile", type=int, default=None, help="Print the time of every stage every this many steps")
+    all_args.add_argument("-hl", "--headless", action="store_true", help="Run only the physics, without a window, and report the steps per second")
+    all_args.add_argument("-st", "--steps", type=int, default=1000, help="Number of steps of the headless run")
+    all_args.add_argument("-se", "--seed", type=int, default=None, help="Seed of the random bodies of the headless run")
+    all_args.add_argument("-dr", "--drift", action="store_true", help="Report the energy and momentum drift of the headless run")
+    all_args.add_argument("-default", "--default", required=False, help="True for default parameters")
+
+
+def split_arguments(args):
+    """The options of the BodySystem and the options of run, out of the parsed arguments as a dictionary"""
+    return {key: args[key] for key in SYSTEM_OPTIONS}, {key: args[key] for key in RUN_OPTIONS}
@@ -1,6 +1,444 @@
 """
 Reaction diffusion with computed laplacian
+Two chemicals u and v diffuse over a grid and react with each other. The laplacian is a five point stencil computed
+with array slices, the fields have a one cell halo around them that holds the boundary (periodic or zero flux), and
+every step writes into a second pair of buffers that is swapped with the first one, so stepping allocates nothing.
+The spectral method (periodic boundaries only) does the diffusion exactly in Fourier space instead, with precomputed
+factors of the wavenumbers, and only the reaction explicitly (first order exponential time differencing), so the
+timestep is not limited by the diffusion.
+For big grids the stencil also runs in parallel (run_parallel): the fields are put once in shared memory and split
+in strips of rows, one per process. Every process updates its own strip in place and fills the halo it needs from the
+rows of its neighbours, and a barrier keeps the processes in the same step, so nothing is copied between steps.
+Models:
+  - gray_scott: u' = Du∇²u - uv² + F(1 - u), v' = Dv∇²v + uv² - (F + k)v
+  - fitzhugh_nagumo: u' = Du∇²u + u - u³ - v + k, v' = (Dv∇²v + u - v)/tau
+Example:
+    python reaction_diffusion.py -si 1024 -st 2000 -F 0.03 -k 0.062
+    python reaction_diffusion.py -si 8192 -st 200 -w 8 -hl
 """
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+from time import perf_counter
+
 import numpy as np
-import matplotlib.pyplot as plt
 
+# Default parameters of every model. The explicit update is only stable if dt < dx²/(4D) for the largest D (D/tau for
+# v in FitzHugh-Nagumo)
+MODELS = {
+    "gray_scott": {"Du": 0.16, "Dv": 0.08, "F": 0.035, "k": 0.065, "tau": 1.0, "dt": 1.0},
+    "fitzhugh_nagumo": {"Du": 0.7, "Dv": 12.5, "F": 0.0, "k": -0.005, "tau": 0.1, "dt": 0.001},
+}
+BOUNDARIES = ("periodic", "neumann")
+# stencil: explicit Euler with the five point laplacian. spectral: exact diffusion in Fourier space, explicit reaction
+METHODS = ("stencil", "spectral")
+# Seconds between the checks that the processes of run_parallel are still alive
+WORKER_POLL_SECONDS = 0.5
+
+
+def fill_halo(field, boundary="periodic"):
+    """Fills the one cell border of the field: the opposite edge if periodic, the same edge if neumann (no flux)"""
+    if boundary == "periodic":
+        field[0, 1:-1] = field[-2, 1:-1]
+        field[-1, 1:-1] = field[1, 1:-1]
+        field[:, 0] = field[:, -2]
+        field[:, -1] = field[:, 1]
+    else:
+        field[0, 1:-1] = field[1, 1:-1]
+        field[-1, 1:-1] = field[-2, 1:-1]
+        field[:, 0] = field[:, 1]
+        field[:, -1] = field[:, -2]
+
+
+def laplacian(field, out, scratch, dx=1.0):
+    """
+    Five point laplacian of the inside of a field with a halo, written into out. scratch is another array with the
+    shape of the inside, every operation writes into out or scratch so nothing is allocated
+    """
+    np.add(field[:-2, 1:-1], field[2:, 1:-1], out=out)
+    out += field[1:-1, :-2]
+    out += field[1:-1, 2:]
+    np.multiply(field[1:-1, 1:-1], 4, out=scratch)
+    out -= scratch
+    if dx != 1.0:
+        out *= 1/dx**2
+    return out
+
+
+class ReactionDiffusion:
+    """
+    The fields u and v of a model on a grid of shape (rows, columns), stored with their halo. u and v are views of the
+    inside of the current buffers. The parameters not given take the defaults of the model. buffers are four arrays
+    of shape (rows + 2, columns + 2) to use instead of new ones, for example views of shared memory
+    """
+    def __init__(
+        self, shape, model="gray_scott", boundary="periodic", dx=1.0, dtype=np.float64, Du=None, Dv=None, F=None,
+        k=None, tau=None, dt=None, method="stencil", buffers=None
+    ):
+        if model not in MODELS:
+            raise ValueError(f"Unknown model {model}, use one of {tuple(MODELS)}")
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"Unknown boundary {boundary}, use one of {BOUNDARIES}")
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, use one of {METHODS}")
+        if method == "spectral" and boundary != "periodic":
+            raise ValueError("The spectral method needs periodic boundaries")
+        self.model = model
+        self.method = method
+        self.boundary = boundary
+        self.dx = dx
+        given = {"Du": Du, "Dv": Dv, "F": F, "k": k, "tau": tau, "dt": dt}
+        parameters = {key: value if value is not None else MODELS[model][key] for key, value in given.items()}
+        self.Du, self.Dv, self.F, self.k = parameters["Du"], parameters["Dv"], parameters["F"], parameters["k"]
+        self.tau, self.dt = parameters["tau"], parameters["dt"]
+        rows, columns = shape
+        # Current and next buffers of both fields, with the halo
+        if buffers is None:
+            buffers = [np.zeros((rows + 2, columns + 2), dtype=dtype) for _ in range(4)]
+        self.buffers = list(buffers)
+        # Scratch arrays with the shape of the inside, for the laplacians and the reaction
+        self.scratch = [np.zeros(shape, dtype=dtype) for _ in range(4)]
+        self.diffusion_factors = self.spectral_factors() if method == "spectral" else None
+        self.T = 0
+
+    def spectral_factors(self):
+        """
+        Factors of the Fourier coefficients (of np.fft.rfft2) of u and v for one step of exponential time differencing.
+        With L = -D|k|², a field f with reaction R advances to exp(L dt) f + (exp(L dt) - 1)/L R: the diffusion is exact
+        and the reaction is taken as constant during the step. Returns the pairs (exp(L dt), (exp(L dt) - 1)/L) of u and
+        of v. In FitzHugh-Nagumo v diffuses with Dv/tau
+        """
+        rows, columns = self.shape
+        ky = 2*np.pi*np.fft.fftfreq(rows, d=self.dx)
+        kx = 2*np.pi*np.fft.rfftfreq(columns, d=self.dx)
+        k2 = ky[:, np.newaxis]**2 + kx[np.newaxis, :]**2
+        Dv = self.Dv / self.tau if self.model == "fitzhugh_nagumo" else self.Dv
+        factors = list()
+        for D in (self.Du, Dv):
+            L = -D * k2
+            decay = np.exp(L * self.dt)
+            # The limit of (exp(L dt) - 1)/L for L = 0 is dt
+            reaction = np.full_like(L, self.dt)
+            np.divide(np.expm1(L * self.dt), L, out=reaction, where=L != 0)
+            factors.append((decay, reaction))
+        return factors
+
+    @property
+    def u_buffer(self):
+        return self.buffers[0]
+
+    @property
+    def v_buffer(self):
+        return self.buffers[1]
+
+    @property
+    def u(self):
+        return self.buffers[0][1:-1, 1:-1]
+
+    @property
+    def v(self):
+        return self.buffers[1][1:-1, 1:-1]
+
+    @property
+    def shape(self):
+        return self.u.shape
+
+    def seed(self, rng, spots=10, size=None, noise=0.01):
+        """
+        Initial state. Gray-Scott starts with u = 1 and v = 0 everywhere except some random square spots where
+        u = 0.5 and v = 0.25, FitzHugh-Nagumo starts with uniform random u and v. Some noise is added to both
+        """
+        rows, columns = self.shape
+        if self.model == "gray_scott":
+            self.u[:] = 1
+            self.v[:] = 0
+            size = size or max(2, min(rows, columns) // 20)
+            for _ in range(spots):
+                row, column = rng.integers(0, rows - size + 1), rng.integers(0, columns - size + 1)
+                self.u[row:row + size, column:column + size] = 0.5
+                self.v[row:row + size, column:column + size] = 0.25
+            self.u[:] += noise * rng.random(self.shape)
+            self.v[:] += noise * rng.random(self.shape)
+        else:
+            self.u[:] = rng.random(self.shape)
+            self.v[:] = rng.random(self.shape)
+
+    def add_reaction(self, u, v, du, dv):
+        """
+        Adds the reaction to the derivatives du and dv, which already hold the diffusion (or zero). In
+        FitzHugh-Nagumo the whole derivative of v is divided by tau
+        """
+        reaction, scratch = self.scratch[2:]
+        if self.model == "gray_scott":
+            # reaction = uv²
+            np.multiply(v, v, out=reaction)
+            reaction *= u
+            # du = Du∇²u - uv² + F(1 - u)
+            du -= reaction
+            np.multiply(u, self.F, out=scratch)
+            du -= scratch
+            du += self.F
+            # dv = Dv∇²v + uv² - (F + k)v
+            dv += reaction
+            np.multiply(v, self.F + self.k, out=scratch)
+            dv -= scratch
+        else:
+            # du = Du∇²u + u - u³ - v + k
+            du += u
+            np.multiply(u, u, out=reaction)
+            reaction *= u
+            du -= reaction
+            du -= v
+            du += self.k
+            # dv = (Dv∇²v + u - v)/tau
+            dv += u
+            dv -= v
+            dv *= 1/self.tau
+
+    def step(self):
+        """Advances one step of length dt with the method of the system"""
+        u_buffer, v_buffer, u_next, v_next = self.buffers
+        du, dv, _, scratch = self.scratch
+        u, v = u_buffer[1:-1, 1:-1], v_buffer[1:-1, 1:-1]
+        if self.method == "spectral":
+            # Only the reaction in real space, the diffusion is in the factors
+            du.fill(0)
+            dv.fill(0)
+            self.add_reaction(u, v, du, dv)
+            for field, reaction, (decay, factor), out in zip((u, v), (du, dv), self.diffusion_factors, (u_next, v_next)):
+                coefficients = np.fft.rfft2(field)
+                coefficients *= decay
+                coefficients += factor * np.fft.rfft2(reaction)
+                out[1:-1, 1:-1] = np.fft.irfft2(coefficients, s=self.shape)
+        else:
+            self.fill_halos(u_buffer, v_buffer)
+            # The derivatives are built inside the laplacian arrays
+            laplacian(u_buffer, du, scratch, self.dx)
+            laplacian(v_buffer, dv, scratch, self.dx)
+            du *= self.Du
+            dv *= self.Dv
+            self.add_reaction(u, v, du, dv)
+            du *= self.dt
+            dv *= self.dt
+            np.add(u, du, out=u_next[1:-1, 1:-1])
+            np.add(v, dv, out=v_next[1:-1, 1:-1])
+        self.swap()
+        self.T += 1
+
+    def fill_halos(self, u_buffer, v_buffer):
+        """Fills the halo of both current fields before a stencil step"""
+        fill_halo(u_buffer, self.boundary)
+        fill_halo(v_buffer, self.boundary)
+
+    def swap(self):
+        """The next buffers become the current ones"""
+        u_buffer, v_buffer, u_next, v_next = self.buffers
+        self.buffers = [u_next, v_next, u_buffer, v_buffer]
+
+    def run(self, steps, consumers=()):
+        """
+        Advances the given number of steps, returns the seconds it took. The consumers (for example a FrameWriter of
+        reaction_diffusion_frames.py) are called with the system after every step
+        """
+        start = perf_counter()
+        for _ in range(steps):
+            self.step()
+            for consumer in consumers:
+                consumer(self)
+        return perf_counter() - start
+
+
+class Strip(ReactionDiffusion):
+    """
+    The rows [start, stop) of a grid whose four buffers (current and next u and v, with the halo) are the arrays of
+    grids, shared with the strips of the other processes. The buffers of the strip are views of its rows and of the
+    halo rows above and below them, which belong to the neighbours, so the halo exchange is only reading them once
+    every strip has finished the step: the halo is filled between two waits on the barrier shared by all the strips.
+    Each strip fills the columns of the halo of its own rows, the first and last strips fill the rows of the halo of
+    the grid
+    """
+    def __init__(self, grids, start, stop, barrier, **parameters):
+        self.grids = list(grids)
+        self.start, self.stop = start, stop
+        self.barrier = barrier
+        columns = self.grids[0].shape[1] - 2
+        views = [grid[start:stop + 2] for grid in self.grids]
+        super().__init__((stop - start, columns), buffers=views, **parameters)
+
+    def fill_halos(self, u_buffer, v_buffer):
+        # Every strip has written its rows of the current buffers
+        self.barrier.wait()
+        rows = slice(self.start + 1, self.stop + 1)
+        for grid in self.grids[:2]:
+            if self.boundary == "periodic":
+                grid[rows, 0] = grid[rows, -2]
+                grid[rows, -1] = grid[rows, 1]
+                if self.start == 0:
+                    grid[0, 1:-1] = grid[-2, 1:-1]
+                if self.stop == grid.shape[0] - 2:
+                    grid[-1, 1:-1] = grid[1, 1:-1]
+            else:
+                grid[rows, 0] = grid[rows, 1]
+                grid[rows, -1] = grid[rows, -2]
+                if self.start == 0:
+                    grid[0, 1:-1] = grid[1, 1:-1]
+                if self.stop == grid.shape[0] - 2:
+                    grid[-1, 1:-1] = grid[-2, 1:-1]
+        # Every halo is full before any strip reads it
+        self.barrier.wait()
+
+    def swap(self):
+        super().swap()
+        u_grid, v_grid, u_next, v_next = self.grids
+        self.grids = [u_next, v_next, u_grid, v_grid]
+
+
+def run_strip(name, shape, dtype, start, stop, steps, barrier, times, parameters):
+    """Advances one strip of the grid in the shared memory block name, this is what every process executes"""
+    block = shared_memory.SharedMemory(name=name)
+    grids = strip = None
+    try:
+        grids = np.ndarray((4, shape[0] + 2, shape[1] + 2), dtype=dtype, buffer=block.buf)
+        strip = Strip(grids, start, stop, barrier, **parameters)
+        barrier.wait()
+        begin = perf_counter()
+        for _ in range(steps):
+            strip.step()
+        times.put(perf_counter() - begin)
+    except Exception:
+        # The other strips would wait for this one at the barrier forever, they get a BrokenBarrierError instead
+        barrier.abort()
+        raise
+    finally:
+        # The arrays must be gone before the block is closed
+        grids = strip = None
+        try:
+            block.close()
+        except BufferError:
+            # The traceback of an error still holds views of the block, the process is ending anyway
+            pass
+
+
+def run_parallel(system, steps, workers=None):
+    """
+    Advances a stencil system the given number of steps split in strips of rows over several processes, one per core
+    by default. The fields are copied to shared memory before the first step and back after the last one. Returns the
+    seconds the slowest process took to step, without starting the processes. If a process fails the others are
+    stopped and a RuntimeError is raised, the system keeps the state it had before
+    """
+    if system.method != "stencil":
+        raise ValueError("Only the stencil method runs in parallel")
+    rows, columns = system.shape
+    workers = min(workers or multiprocessing.cpu_count(), rows)
+    dtype = system.u.dtype
+    parameters = {
+        "model": system.model, "boundary": system.boundary, "dx": system.dx, "dtype": dtype, "Du": system.Du,
+        "Dv": system.Dv, "F": system.F, "k": system.k, "tau": system.tau, "dt": system.dt
+    }
+    block = shared_memory.SharedMemory(create=True, size=4 * (rows + 2) * (columns + 2) * dtype.itemsize)
+    grids = None
+    processes = list()
+    try:
+        grids = np.ndarray((4, rows + 2, columns + 2), dtype=dtype, buffer=block.buf)
+        grids[0] = system.u_buffer
+        grids[1] = system.v_buffer
+        bounds = np.linspace(0, rows, workers + 1).astype(int)
+        barrier = multiprocessing.Barrier(workers)
+        times = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=run_strip,
+                args=(block.name, (rows, columns), dtype, start, stop, steps, barrier, times, parameters)
+            )
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        for process in processes:
+            process.start()
+        seconds = list()
+        while len(seconds) < len(processes):
+            try:
+                seconds.append(times.get(timeout=WORKER_POLL_SECONDS))
+            except queue.Empty:
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"A strip process failed with exit code {failed[0]}")
+        for process in processes:
+            process.join()
+        # After an odd number of steps the current fields are in the second pair of buffers
+        current = 2 * (steps % 2)
+        system.u[:] = grids[current][1:-1, 1:-1]
+        system.v[:] = grids[current + 1][1:-1, 1:-1]
+        system.T += steps
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        # The array must be gone before the block is closed
+        grids = None
+        block.close()
+        block.unlink()
+    return max(seconds)
+
+
+def show(system, field="v"):
+    """Shows one of the fields in a matplotlib window"""
+    # matplotlib is only needed to show the result, the headless runs work without it
+    import matplotlib.pyplot as plt
+
+    plt.imshow(getattr(system, field), cmap="viridis")
+    plt.title(f"{system.model}, {field} at T = {system.T}")
+    plt.colorbar()
+    plt.show()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Reaction diffusion on a grid")
+
+    # Add arguments to the parser
+    all_args.add_argument("-si", "--size", type=int, nargs="+", default=[256], help="Rows and columns of the grid, one number for a square grid")
+    all_args.add_argument("-m", "--model", choices=tuple(MODELS), default="gray_scott", help="Reaction model")
+    all_args.add_argument("-Du", "--Du", type=float, default=None, help="Diffusion coefficient of u")
+    all_args.add_argument("-Dv", "--Dv", type=float, default=None, help="Diffusion coefficient of v")
+    all_args.add_argument("-F", "--F", type=float, default=None, help="Feed rate of Gray-Scott")
+    all_args.add_argument("-k", "--k", type=float, default=None, help="Kill rate of Gray-Scott, constant term of FitzHugh-Nagumo")
+    all_args.add_argument("-ta", "--tau", type=float, default=None, help="Time scale of v in FitzHugh-Nagumo")
+    all_args.add_argument("-dt", "--dt", type=float, default=None, help="Timestep")
+    all_args.add_argument("-dx", "--dx", type=float, default=1.0, help="Grid spacing")
+    all_args.add_argument("-me", "--method", choices=METHODS, default="stencil", help="Explicit stencil or semi-implicit spectral (periodic only)")
+    all_args.add_argument("-b", "--boundary", choices=BOUNDARIES, default="periodic", help="Boundary condition")
+    all_args.add_argument("-dty", "--dtype", choices=("float64", "float32"), default="float64", help="Precision of the fields")
+    all_args.add_argument("-st", "--steps", type=int, default=5000, help="Number of steps")
+    all_args.add_argument("-se", "--seed", type=int, default=None, help="Seed of the initial state")
+    all_args.add_argument("-w", "--workers", type=int, default=None, help="Run the stencil in this many processes, 0 for one per core")
+    all_args.add_argument("-o", "--output", default=None, help="Stream the fields to disk with this name, see reaction_diffusion_frames.py")
+    all_args.add_argument("-ev", "--every", type=int, default=10, help="Steps between the frames written to disk")
+    all_args.add_argument("-fo", "--format", choices=("npy", "png"), default="npy", help="Frames as a memory mapped stack or as numbered images")
+    all_args.add_argument("-hl", "--headless", action="store_true", help="Only report the steps per second, without showing the result")
+    args = vars(all_args.parse_args())
+    if args["output"] and args["workers"] is not None:
+        all_args.error("The frames are only written by the single process engine")
+
+    shape = tuple(args["size"]) * 2 if len(args["size"]) == 1 else tuple(args["size"][:2])
+    system = ReactionDiffusion(
+        shape, args["model"], args["boundary"], args["dx"], args["dtype"], args["Du"], args["Dv"], args["F"],
+        args["k"], args["tau"], args["dt"], args["method"]
+    )
+    system.seed(np.random.default_rng(args["seed"]))
+    if args["output"]:
+        from reaction_diffusion_frames import FrameWriter
+
+        writer = FrameWriter(args["output"], system, args["steps"], args["every"], args["format"])
+        seconds = system.run(args["steps"], [writer])
+        writer.close()
+        print(f"{writer.frames} frames written to {args['output']}, {writer.dropped} dropped")
+    elif args["workers"] is None:
+        seconds = system.run(args["steps"])
+    else:
+        seconds = run_parallel(system, args["steps"], args["workers"])
+    print(f"{shape[0]}x{shape[1]} {system.model}, {args['steps']} steps in {seconds:.2f} s: {args['steps']/seconds:.1f} steps/s")
+    if not args["headless"]:
+        show(system)
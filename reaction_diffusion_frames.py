@@ -0,0 +1,126 @@
+"""
+Streaming of the fields of reaction_diffusion.py to disk while the simulation runs.
+FrameWriter is called after every step (see ReactionDiffusion.run) and keeps one every stride steps: it copies u and v
+into one of a few preallocated slots and hands the slot to a background thread, which writes it and gives it back.
+The simulation never waits for the disk: if every slot is still waiting to be written the frame is dropped and
+counted. If writing fails the error is raised by the next call and by close, so a broken output does not go
+unnoticed. The frames go to a memory mapped .npy stack of shape (frames, 2, rows, columns) in float32, with the steps
+of the frames in <name>_meta.npz, or to numbered PNG images with u and v side by side.
+Example:
+    python reaction_diffusion.py -si 512 -st 10000 -o run -ev 50 -hl
+"""
+import queue
+import threading
+
+import numpy as np
+
+
+def frame_paths(name):
+    """Files of a recording: the frame stack and the metadata (stride, frames, steps of the frames, dropped)"""
+    return f"{name}_frames.npy", f"{name}_meta.npz"
+
+
+def to_image(field):
+    """A field as 8 bit gray levels, from its minimum (black) to its maximum (white)"""
+    low, high = field.min(), field.max()
+    scale = 255 / (high - low) if high > low else 0
+    return ((field - low) * scale).astype(np.uint8)
+
+
+class FrameWriter:
+    """
+    Records u and v after every stride steps, up to steps steps, as a frame stack (format "npy") or as the images
+    <name>_000100.png and so on (format "png"). slots is how many frames can wait to be written at the same time
+    """
+    def __init__(self, name, system, steps, stride=1, format="npy", slots=4):
+        if format not in ("npy", "png"):
+            raise ValueError(f"Unknown format {format}, use npy or png")
+        self.name = name
+        self.stride = max(1, stride)
+        self.format = format
+        self.capacity = steps // self.stride
+        rows, columns = system.shape
+        if format == "npy":
+            stack_path, _ = frame_paths(name)
+            self.stack = np.lib.format.open_memmap(
+                stack_path, mode="w+", dtype=np.float32, shape=(self.capacity, 2, rows, columns)
+            )
+        else:
+            # Pillow is only needed for the images, the frame stack works without it
+            from PIL import Image
+
+            self.image = Image
+        self.slots = np.empty((max(1, slots), 2, rows, columns), dtype=np.float32)
+        self.free = queue.Queue()
+        for slot in range(len(self.slots)):
+            self.free.put(slot)
+        self.pending = queue.Queue()
+        self.steps = list()
+        self.frames = 0
+        self.dropped = 0
+        # Exception that stopped the background thread, if any
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def __call__(self, system):
+        self.check()
+        if system.T % self.stride != 0 or self.frames + self.dropped >= self.capacity:
+            return
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        self.slots[slot, 0] = system.u
+        self.slots[slot, 1] = system.v
+        self.pending.put((slot, self.frames, system.T))
+        self.steps.append(system.T)
+        self.frames += 1
+
+    def write_loop(self):
+        """Writes the frames as they come until it gets None, this is what the background thread executes"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            slot, frame, step = item
+            try:
+                if self.format == "npy":
+                    self.stack[frame] = self.slots[slot]
+                else:
+                    u, v = self.slots[slot]
+                    self.image.fromarray(np.hstack((to_image(u), to_image(v)))).save(f"{self.name}_{step:06d}.png")
+            except Exception as error:
+                self.error = error
+                return
+            self.free.put(slot)
+
+    def check(self):
+        """Raises the error that stopped the background thread, if there was one"""
+        if self.error is not None:
+            raise RuntimeError(f"Writing the frames of {self.name} failed") from self.error
+
+    def close(self):
+        """Waits for the frames still in the slots, writes them to disk and records how many there are"""
+        self.pending.put(None)
+        self.thread.join()
+        self.check()
+        if self.format == "npy":
+            self.stack.flush()
+            _, meta_path = frame_paths(self.name)
+            np.savez(
+                meta_path, stride=self.stride, frames=self.frames, steps=np.array(self.steps, dtype=np.int64),
+                dropped=self.dropped
+            )
+
+
+def load_frames(name):
+    """
+    Opens a frame stack without reading it into memory. Returns the frames, memory mapped and cut to the ones that
+    were written, and the metadata as a dictionary
+    """
+    stack_path, meta_path = frame_paths(name)
+    with np.load(meta_path) as data:
+        meta = {key: data[key] for key in data.files}
+    return np.load(stack_path, mmap_mode="r")[:int(meta["frames"])], meta
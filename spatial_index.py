@@ -0,0 +1,183 @@
+"""
+Spatial index of spheres (circles in 2D) shared by the many body simulations and the colorblind plate generator.
+Both ask the same question, which spheres are closer than the sum of their radii plus a margin, and both answer it
+with a uniform grid: the space is divided in cells about as big as the largest distance at which two spheres can
+touch, so a sphere only has to be compared with the spheres of the cells around it instead of with all of them.
+There are two ways of using it:
+  - Bulk, on whole arrays of positions (n, D) and radii (n,): pairs_within finds every overlapping pair of a set and
+    overlapping_between every overlap between two sets. The points are sorted by cell so the candidates of all the
+    points come out of a few searchsorted calls.
+  - Incremental, with SpatialIndex: spheres are inserted one at a time and every query looks only at the cells around
+    it, which is what placing circles one after another needs. It only answers if a new sphere would overlap, the
+    bulk functions do the rest.
+overlaps is the test for a single pair that the grid replaces when there are many.
+"""
+import itertools
+import math
+from collections import defaultdict
+
+import numpy as np
+
+# Smallest cell size, for sets where every radius is zero
+MINIMUM_CELL_SIZE = 1e-12
+# The bulk queries keep a table of every cell of the grid if it has at most this many cells per point
+DENSE_CELLS_PER_POINT = 16
+# Largest number of cells of a grid whose cells can be numbered with an int64 key, past it the keys are made with unique
+MAXIMUM_KEYED_CELLS = np.iinfo(np.int64).max
+
+
+def overlaps(position, radius, other_position, other_radius, margin=0, inclusive=True, distance=None):
+    """
+    If two spheres are closer than the sum of their radii plus the margin. With inclusive=False touching does not
+    count. The distance between the centers can be given if it is already known
+    """
+    if distance is None:
+        distance = np.linalg.norm(np.subtract(position, other_position))
+    reach = radius + other_radius + margin
+    return distance <= reach if inclusive else distance < reach
+
+
+def cell_keys(query_cells, cells):
+    """
+    One integer per cell for the points, and for every offset of the 3^D neighbourhood the keys of the neighbours of
+    the query cells, as ({offset: keys}, keys, number of keys). The keys number the cells of the box around all of
+    them, with a border of one cell so the neighbours of every cell have a key too. When the points are so far apart
+    that the box has more cells than an int64 can number, the keys are only given to the cells that are used, with
+    np.unique
+    """
+    dimension = cells.shape[1]
+    offsets = list(itertools.product((-1, 0, 1), repeat=dimension))
+    low = np.minimum(cells.min(axis=0), query_cells.min(axis=0)) - 1
+    shape = np.maximum(cells.max(axis=0), query_cells.max(axis=0)) - low + 2
+    # Python integers, the product does not overflow
+    number_cells = math.prod(shape.tolist())
+    if number_cells <= MAXIMUM_KEYED_CELLS:
+        strides = np.concatenate(([1], np.cumprod(shape[:-1])))
+        query_keys = (query_cells - low) @ strides
+        neighbours = {offset: query_keys + np.dot(offset, strides) for offset in offsets}
+        return neighbours, (cells - low) @ strides, number_cells
+    every_cell = np.concatenate([cells] + [query_cells + np.array(offset) for offset in offsets])
+    used, keys = np.unique(every_cell, axis=0, return_inverse=True)
+    keys = keys.reshape(-1)
+    rows = len(query_cells)
+    neighbours = {
+        offset: keys[len(cells) + number*rows:len(cells) + (number + 1)*rows] for number, offset in enumerate(offsets)
+    }
+    return neighbours, keys[:len(cells)], len(used)
+
+
+def neighbour_candidates(query_cells, cells):
+    """
+    Pairs (q, i) of every query cell q with every point i in the 3^D cells around it, both given as (n, D) integer
+    cells. The points are sorted by cell, so the points of a cell are contiguous and found with searchsorted
+    """
+    neighbour_keys, keys, number_cells = cell_keys(query_cells, cells)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    dense = number_cells <= DENSE_CELLS_PER_POINT * (len(keys) + len(query_cells))
+    if dense:
+        # Few enough cells to keep where every cell starts and how many points it has, instead of searching for them
+        cell_counts = np.bincount(keys, minlength=number_cells)
+        cell_starts = np.cumsum(cell_counts) - cell_counts
+
+    pairs_q, pairs_i = list(), list()
+    for neighbours in neighbour_keys.values():
+        if dense:
+            start, counts = cell_starts[neighbours], cell_counts[neighbours]
+        else:
+            start = np.searchsorted(sorted_keys, neighbours, side="left")
+            counts = np.searchsorted(sorted_keys, neighbours, side="right") - start
+        # Every query point against every point of its neighbouring cell
+        q = np.repeat(np.arange(len(query_cells)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pairs_q.append(q)
+        pairs_i.append(order[np.repeat(start, counts) + offsets])
+    return np.concatenate(pairs_q), np.concatenate(pairs_i)
+
+
+def within(positions_a, radii_a, positions_b, radii_b, margin=0, inclusive=True):
+    """For every pair of rows, if the spheres a and b are closer than the sum of their radii plus the margin"""
+    difference = positions_b - positions_a
+    squared = np.einsum("ij,ij->i", difference, difference)
+    reach = (radii_a + radii_b + margin)**2
+    return squared <= reach if inclusive else squared < reach
+
+
+def pairs_within(positions, radii, margin=0, inclusive=True):
+    """
+    Every pair of spheres of a set whose distance is less than the sum of their radii plus the margin. Returns two
+    index arrays (i, j) with i < j, one element per pair
+    """
+    empty = np.zeros(0, dtype=np.intp)
+    if len(positions) < 2:
+        return empty, empty
+    # The largest distance at which two spheres touch, this is the size of the cells
+    cell_size = max(2 * radii.max() + margin, MINIMUM_CELL_SIZE)
+    cells = np.floor((positions - positions.min(axis=0)) / cell_size).astype(np.int64)
+    i, j = neighbour_candidates(cells, cells)
+    # Every pair is found from both sides, keep it once
+    keep = i < j
+    i, j = i[keep], j[keep]
+    touching = within(positions[i], radii[i], positions[j], radii[j], margin, inclusive)
+    return i[touching], j[touching]
+
+
+def overlapping_between(query_positions, query_radii, positions, radii, margin=0, inclusive=True):
+    """
+    Pairs (q, i) of a query sphere q closer to the sphere i than the sum of their radii plus the margin, both sets
+    given as (n, D) positions and (n,) radii
+    """
+    empty = np.zeros(0, dtype=np.intp)
+    if len(query_positions) == 0 or len(positions) == 0:
+        return empty, empty
+    cell_size = max(query_radii.max() + radii.max() + margin, MINIMUM_CELL_SIZE)
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    query_cells = np.floor(query_positions / cell_size).astype(np.int64)
+    q, i = neighbour_candidates(query_cells, cells)
+    touching = within(query_positions[q], query_radii[q], positions[i], radii[i], margin, inclusive)
+    return q[touching], i[touching]
+
+
+class SpatialIndex:
+    """
+    Spheres in a uniform grid of cells of side cell_size, in any dimension, inserted one at a time. Every cell holds the
+    (position, radius) of the spheres with their center in it, which is the only copy of them. The cells should be
+    about the diameter of the biggest sphere, then a query only looks at the 3^D cells around it
+    """
+    def __init__(self, cell_size, dimension=2):
+        self.cell_size = cell_size
+        self.dimension = dimension
+        self.cells = defaultdict(list)
+        self.max_radius = 0
+        self.count = 0
+
+    def cell(self, position):
+        size = self.cell_size
+        return tuple([int(coordinate // size) for coordinate in position])
+
+    def insert(self, position, radius=0):
+        """Adds a sphere"""
+        position = tuple(map(float, position))
+        self.cells[self.cell(position)].append((position, radius))
+        if radius > self.max_radius:
+            self.max_radius = radius
+        self.count += 1
+
+    def is_overlapping(self, position, radius=0, margin=0, inclusive=True):
+        """If a sphere at position with that radius would overlap any sphere of the index, see overlaps"""
+        # The circles of the plates are placed one by one with this test, so the test of overlaps is written out here
+        # instead of calling it for every sphere
+        cells = self.cells
+        limit = radius + margin
+        # A sphere can only touch spheres whose center is closer than the sum of the radii
+        reach = int(math.ceil((limit + self.max_radius) / self.cell_size))
+        ranges = [range(coordinate - reach, coordinate + reach + 1) for coordinate in self.cell(position)]
+        for cell in itertools.product(*ranges):
+            for other_position, other_radius in cells.get(cell, ()):
+                distance = math.dist(position, other_position)
+                if distance <= limit + other_radius and (inclusive or distance < limit + other_radius):
+                    return True
+        return False
+
+    def __len__(self):
+        return self.count
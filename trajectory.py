@@ -0,0 +1,115 @@
+"""
+Recording of the many body simulations to disk and replay without recomputing the physics.
+TrajectoryWriter is a consumer of a Simulation (see many_body_core.py) that streams the positions and velocities of
+one every stride steps into preallocated memory mapped .npy files of shape (frames, N, D) in float32, so long runs do
+not have to fit in memory. A recording made of the files <name>_positions.npy, <name>_velocities.npy and
+<name>_meta.npz can be replayed with
+    python trajectory.py <name>
+"""
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def trajectory_paths(name):
+    """Files of a recording: positions, velocities and the metadata (radii, masses, box, stride, frames)"""
+    return f"{name}_positions.npy", f"{name}_velocities.npy", f"{name}_meta.npz"
+
+
+class TrajectoryWriter:
+    """
+    Records the state of the system at the steps that are multiples of stride, for the next steps steps. The files
+    are created with their final size before the run, the frames are written into them as they come
+    """
+    def __init__(self, name, system, steps, stride=1):
+        self.name = name
+        self.stride = max(1, stride)
+        self.system = system
+        # One frame per multiple of stride in (T, T + steps], a resumed run does not have to start on one
+        frames = (system.T + steps) // self.stride - system.T // self.stride
+        shape = (frames, system.number_bodies, system.dimension)
+        positions_path, velocities_path, _ = trajectory_paths(name)
+        self.positions = np.lib.format.open_memmap(positions_path, mode="w+", dtype=np.float32, shape=shape)
+        self.velocities = np.lib.format.open_memmap(velocities_path, mode="w+", dtype=np.float32, shape=shape)
+        self.frames = 0
+        self.write_meta()
+
+    def write_meta(self):
+        _, _, meta_path = trajectory_paths(self.name)
+        np.savez(
+            meta_path, masses=self.system.masses, radii=self.system.radii, box=self.system.box, stride=self.stride,
+            frames=self.frames
+        )
+
+    def __call__(self, system):
+        if system.T % self.stride != 0 or self.frames == self.positions.shape[0]:
+            return
+        self.positions[self.frames] = system.positions
+        self.velocities[self.frames] = system.velocities
+        self.frames += 1
+
+    def close(self):
+        """Writes the frames to disk and records how many there are, the run may have stopped early"""
+        self.positions.flush()
+        self.velocities.flush()
+        self.write_meta()
+
+
+def load_trajectory(name):
+    """
+    Opens a recording without reading it into memory. Returns the positions and velocities, memory mapped and cut to
+    the frames that were written, and the metadata as a dictionary
+    """
+    positions_path, velocities_path, meta_path = trajectory_paths(name)
+    with np.load(meta_path) as data:
+        meta = {key: data[key] for key in data.files}
+    frames = int(meta["frames"])
+    positions = np.load(positions_path, mmap_mode="r")[:frames]
+    velocities = np.load(velocities_path, mmap_mode="r")[:frames]
+    return positions, velocities, meta
+
+
+def replay(name, fps=60, render_every=1):
+    """Animates a recording in a Tkinter window, one every render_every frames at most fps frames per second"""
+    import tkinter as tk
+    from many_body_render import PerspectiveProjection, TkRenderer, circle_boxes
+
+    positions, _, meta = load_trajectory(name)
+    box = meta["box"]
+    root = tk.Tk()
+    root.wm_title(f"Many body replay: {name}")
+    canvas = tk.Canvas(root, width=int(box[0]), height=int(box[1]), bg="black")
+    canvas.grid(row=0, column=0)
+
+    # The renderer only needs the positions, the radii and the step of each frame
+    view = SimpleNamespace(positions=np.asarray(positions[0], dtype=float), radii=meta["radii"], T=0)
+    view.number_bodies = view.positions.shape[0]
+    if view.positions.shape[1] == 3:
+        bounding_boxes = PerspectiveProjection((box[0]/2, box[1]/2, box[2]*1.25), box[2], box/2)
+    else:
+        bounding_boxes = circle_boxes
+    renderer = TkRenderer(canvas, view, bounding_boxes)
+    for frame in range(0, positions.shape[0], max(1, render_every)):
+        start = perf_counter()
+        view.positions = np.asarray(positions[frame], dtype=float)
+        view.T = frame * int(meta["stride"])
+        if renderer(view) is False:
+            return
+        sleep(max(0, 1/fps - (perf_counter() - start)))
+    tk.mainloop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Construct an argument parser
+    all_args = argparse.ArgumentParser("Replays a recorded many body simulation")
+
+    # Add arguments to the parser
+    all_args.add_argument("name", help="Name of the recording, the files are <name>_positions.npy and so on")
+    all_args.add_argument("-fps", "--fps", type=float, default=60, help="Frames per second of the replay")
+    all_args.add_argument("-re", "--render_every", type=int, default=1, help="Show only one every this many frames")
+    args = vars(all_args.parse_args())
+
+    replay(args["name"], args["fps"], args["render_every"])